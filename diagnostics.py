@@ -0,0 +1,188 @@
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# variável de ambiente que liga o modo de diagnóstico (ex: PAINTPY_DIAGNOSTICS=1);
+# com o valor PROFILE_VALUE o cProfile também é ligado
+ENV_VAR = "PAINTPY_DIAGNOSTICS"
+PROFILE_VALUE = "profile"
+# intervalo do heartbeat no laço de eventos do Tk, em ms
+HEARTBEAT_MS = 50
+# atraso a partir do qual o laço de eventos é considerado travado, em ms
+LAG_THRESHOLD_MS = 100
+# intervalo entre amostras da pilha da thread principal durante uma trava, em ms
+SAMPLE_MS = 10
+
+# handlers cronometrados em cada objeto
+DRAWING_HANDLERS = ("start_action", "perform_action", "end_action", "apply_remote_action",
+                    "_finalize_text", "clear_canvas")
+# processa_mensagem roda na thread do socket e cobre os handlers de imagem e seleção
+PEER_HANDLERS = ("envia_mensagem", "processa_mensagem")
+
+
+class Diagnostics:
+    """
+    modo de diagnóstico opcional para descobrir o que trava o root.mainloop().
+
+    - mede o atraso do laço de eventos com um heartbeat via root.after;
+    - uma thread vigia o heartbeat e, quando o atraso passa de LAG_THRESHOLD_MS,
+      amostra a pilha da thread principal;
+    - cronometra os handlers de DrawingTools e Peer;
+    - opcionalmente (PAINTPY_DIAGNOSTICS=profile) roda o cProfile na thread
+      principal. Ele deixa o programa mais lento e infla os atrasos e tempos
+      medidos acima, por isso fica separado.
+
+    ao sair, grava paintpy-<pid>.folded (pilhas no formato do
+    flamegraph.pl/speedscope), paintpy-<pid>.prof (cProfile/snakeviz, se ligado)
+    e imprime um resumo.
+
+    no modo normal nada disso é instalado, então não há custo.
+    """
+    def __init__(self, root, output_dir=".", profile=False):
+        """
+        Args:
+            root (tk.Tk): janela principal do Tkinter.
+            output_dir (str): pasta onde os relatórios são gravados.
+            profile (bool): também roda o cProfile.
+        """
+        self.root = root
+        self.output_dir = output_dir
+        self.main_thread_id = threading.get_ident()
+
+        self.last_beat = time.perf_counter()
+        self.max_lag_ms = 0.0
+        self.stalls = 0
+        self._stalled = False
+        # pilhas amostradas durante travas: "func (arquivo:linha);..." -> quantidade
+        self.samples = Counter()
+        # handler -> [chamadas, tempo total, tempo máximo] (em segundos)
+        self.timings = {}
+        self._lock = threading.Lock()
+
+        self.profiler = cProfile.Profile() if profile else None
+        self._running = False
+
+    @classmethod
+    def from_env(cls, root):
+        """
+        cria o diagnóstico se a variável de ambiente estiver ligada.
+
+        Returns:
+            Diagnostics | None: None no modo normal.
+        """
+        value = os.environ.get(ENV_VAR, "")
+        if value in ("", "0"):
+            return None
+        return cls(root, profile=value == PROFILE_VALUE)
+
+    def instrument(self, drawing_tools, peer):
+        """
+        substitui os handlers por versões cronometradas.
+
+        deve ser chamado antes de a interface fazer os binds dos eventos.
+        """
+        for obj, names in ((drawing_tools, DRAWING_HANDLERS), (peer, PEER_HANDLERS)):
+            if obj is None:
+                continue
+            for name in names:
+                setattr(obj, name, self._timed(f"{type(obj).__name__}.{name}", getattr(obj, name)))
+
+    def start(self):
+        """
+        inicia o heartbeat, a thread vigia e o profiler.
+        """
+        self._running = True
+        self.last_beat = time.perf_counter()
+        self.root.after(HEARTBEAT_MS, self._beat)
+
+        watchdog = threading.Thread(target=self._watch)
+        watchdog.daemon = True
+        watchdog.start()
+
+        if self.profiler:
+            self.profiler.enable()
+        print(f"[diagnóstico] ligado (heartbeat {HEARTBEAT_MS} ms, limite {LAG_THRESHOLD_MS} ms"
+              f"{', cProfile' if self.profiler else ''})")
+
+    def stop(self):
+        """
+        para a coleta e grava os relatórios.
+        """
+        self._running = False
+        prefix = os.path.join(self.output_dir, f"paintpy-{os.getpid()}")
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(prefix + ".prof")
+        with open(prefix + ".folded", "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        print(f"[diagnóstico] atraso máximo do laço de eventos: {self.max_lag_ms:.1f} ms, "
+              f"travas acima de {LAG_THRESHOLD_MS} ms: {self.stalls}")
+        print(f"[diagnóstico] {'handler':<45} {'chamadas':>9} {'total ms':>10} {'média ms':>9} {'máx ms':>9}")
+        for name, (calls, total, worst) in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+            print(f"[diagnóstico] {name:<45} {calls:>9} {total * 1000:>10.1f} "
+                  f"{total * 1000 / calls:>9.2f} {worst * 1000:>9.2f}")
+        print(f"[diagnóstico] relatórios em {prefix}.folded" + (f" e {prefix}.prof" if self.profiler else ""))
+
+    def _timed(self, name, handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                # o mesmo handler pode rodar na thread do Tk ou na do socket
+                key = name if threading.get_ident() == self.main_thread_id else f"{name} [thread]"
+                with self._lock:
+                    timing = self.timings.setdefault(key, [0, 0.0, 0.0])
+                    timing[0] += 1
+                    timing[1] += elapsed
+                    timing[2] = max(timing[2], elapsed)
+        return wrapper
+
+    def _beat(self):
+        """
+        heartbeat na thread do Tk: o atraso em relação ao agendado é o tempo em que o laço ficou ocupado.
+        """
+        if not self._running:
+            return
+        now = time.perf_counter()
+        lag_ms = (now - self.last_beat) * 1000 - HEARTBEAT_MS
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        self.last_beat = now
+        self._stalled = False
+        self.root.after(HEARTBEAT_MS, self._beat)
+
+    def _watch(self):
+        """
+        thread vigia: amostra a pilha da thread principal enquanto o heartbeat estiver atrasado.
+        """
+        while self._running:
+            time.sleep(SAMPLE_MS / 1000)
+            lag_ms = (time.perf_counter() - self.last_beat) * 1000 - HEARTBEAT_MS
+            if lag_ms < LAG_THRESHOLD_MS:
+                continue
+            if not self._stalled:
+                self._stalled = True
+                self.stalls += 1
+            frame = sys._current_frames().get(self.main_thread_id)
+            if frame is not None:
+                self.samples[self._fold(frame)] += 1
+
+    @staticmethod
+    def _fold(frame):
+        """
+        converte a pilha para o formato "raiz;...;topo" usado pelos flamegraphs.
+        """
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
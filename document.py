@@ -0,0 +1,438 @@
+import json
+import sys
+import threading
+import time
+from array import array
+
+from selection_tool import decode_ranges, encode_ranges
+
+# ferramentas conhecidas; a coluna "tool" guarda o índice nesta tupla
+TOOLS = ("pen", "eraser", "line", "rectangle", "circle", "text", "image",
+         "clear", "select", "move", "scale")
+TOOL_INDEX = {name: index for index, name in enumerate(TOOLS)}
+# ferramentas cujos segmentos consecutivos formam um único traço
+STROKE_TOOLS = ("pen", "eraser")
+# operações de controle, descartadas na compactação
+CONTROL_TOOLS = ("clear", "select", "move", "scale")
+# valor da coluna "seq" para registros que não são operações numeradas
+NO_SEQ = 0xFFFFFFFF
+# maior valor das colunas "H" (tamanho e índices de usuário/cor)
+MAX_SHORT = 0xFFFF
+# valor dos índices de operações para números sem linha
+NO_ROW = 0xFFFFFFFF
+# números de operação muito à frente do último conhecido vão para um dicionário,
+# para um número enorme vindo da rede não alocar um array gigante
+MAX_SEQ_GAP = 1 << 16
+# colunas numéricas, na ordem em que são gravadas em arquivo
+COLUMNS = ("tool", "user", "seq", "color", "size", "x1", "y1", "x2", "y2", "t")
+
+
+class InternTable:
+    """
+    tabela de strings internadas (cores, usuários): cada string distinta é
+    guardada uma única vez e as colunas guardam apenas o seu índice.
+    """
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def intern(self, value):
+        """
+        retorna o índice da string, adicionando-a à tabela se necessário.
+        """
+        index = self._index.get(value)
+        if index is None:
+            index = len(self.values)
+            self.values.append(value)
+            self._index[value] = index
+        return index
+
+    def find(self, value):
+        """
+        retorna o índice da string, ou None se ela não estiver na tabela.
+        """
+        return self._index.get(value)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class Stroke:
+    """
+    um traço do pincel/borracha: segmentos consecutivos de um mesmo usuário.
+
+    os segmentos ficam nas linhas [start, stop) do documento, possivelmente
+    intercalados com operações de outros usuários.
+    """
+    __slots__ = ("user", "tool", "color", "size", "start", "stop", "count")
+
+    def __init__(self, user, tool, color, size, start):
+        self.user = user
+        self.tool = tool
+        self.color = color
+        self.size = size
+        self.start = start
+        self.stop = start + 1
+        self.count = 1
+
+
+class Document:
+    """
+    registro compacto, em colunas, de todas as operações feitas no canvas.
+
+    cada operação é uma linha; as colunas são arrays tipados, então um
+    segmento do pincel ocupa ~31 bytes em vez de uma lista de strings.
+
+    colunas:
+        - tool (B): índice em TOOLS
+        - user (H): índice na tabela de usuários
+        - seq (I): número da operação do usuário (NO_SEQ para operações de controle)
+        - color (H): índice na tabela de cores
+        - size (H): tamanho do pincel/fonte
+        - x1, y1, x2, y2 (f): coordenadas. Para 'move' (x1, y1) é o deslocamento;
+          para 'scale' (x1, y1) é a origem e x2 o fator.
+        - t (f): segundos desde o início da sessão.
+
+    textos, hashes de imagens e intervalos de seleção ficam em "extra", um
+    dicionário esparso linha -> string.
+
+    as operações numeradas também são indexadas por (usuário, seq) -> linha,
+    em um array por usuário (os números de cada usuário são consecutivos).
+    """
+    def __init__(self):
+        self.tool = array("B")
+        self.user = array("H")
+        self.seq = array("I")
+        self.color = array("H")
+        self.size = array("H")
+        self.x1 = array("f")
+        self.y1 = array("f")
+        self.x2 = array("f")
+        self.y2 = array("f")
+        self.t = array("f")
+        self.extra = {}
+
+        self.users = InternTable()
+        self.colors = InternTable()
+        self.strokes = []
+        # traço em andamento de cada usuário (índice do usuário -> Stroke)
+        self._open_strokes = {}
+        # índice do usuário -> array seq -> linha (NO_ROW se não houver)
+        self._op_rows = []
+        # (índice do usuário, seq) -> linha, para números fora do array
+        self._sparse_op_rows = {}
+        # append é chamado tanto pela thread do Tk quanto pela thread do socket
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def __len__(self):
+        return len(self.tool)
+
+    def append(self, user, tool, color="", size=0, x1=0, y1=0, x2=0, y2=0, extra=None, seq=NO_SEQ, t=None):
+        """
+        adiciona uma operação ao final do documento.
+
+        Args:
+            user (str): usuário que fez a operação.
+            tool (str): nome da ferramenta (ver TOOLS).
+            color (str): cor do desenho.
+            size (int): tamanho do pincel ou fonte.
+            x1, y1, x2, y2 (float): coordenadas da operação.
+            extra (str | None): texto, hash da imagem ou intervalos da seleção.
+            seq (int): número da operação do usuário.
+            t (float | None): instante da operação. Por padrão, o momento atual.
+
+        Returns:
+            int: índice da linha adicionada.
+
+        Raises:
+            ValueError: ferramenta desconhecida ou valor fora do intervalo da coluna.
+                Nesse caso nenhuma coluna é alterada.
+        """
+        # tudo é validado antes de mexer nas colunas: uma falha no meio do
+        # caminho deixaria as colunas com tamanhos diferentes
+        tool_index = TOOL_INDEX.get(tool)
+        if tool_index is None:
+            raise ValueError(f"ferramenta desconhecida: {tool!r}")
+        if not 0 <= size <= MAX_SHORT:
+            raise ValueError(f"tamanho fora do intervalo: {size}")
+        if not 0 <= seq <= NO_SEQ:
+            raise ValueError(f"número da operação fora do intervalo: {seq}")
+        x1, y1, x2, y2 = float(x1), float(y1), float(x2), float(y2)
+
+        with self._lock:
+            row = len(self.tool)
+            user_index = self.users.intern(user)
+            color_index = self.colors.intern(color)
+            if user_index > MAX_SHORT or color_index > MAX_SHORT:
+                raise ValueError("tabela de usuários ou de cores cheia")
+
+            self.tool.append(tool_index)
+            self.user.append(user_index)
+            self.seq.append(seq)
+            self.color.append(color_index)
+            self.size.append(size)
+            self.x1.append(x1)
+            self.y1.append(y1)
+            self.x2.append(x2)
+            self.y2.append(y2)
+            # calculado dentro do lock para a coluna ficar em ordem crescente
+            self.t.append(time.monotonic() - self._started if t is None else t)
+            if extra is not None:
+                self.extra[row] = extra
+
+            self._track_stroke(row, user_index, tool, color_index, size)
+            if seq != NO_SEQ:
+                self._index_op(row, user_index, seq)
+            return row
+
+    def _index_op(self, row, user_index, seq):
+        while len(self._op_rows) <= user_index:
+            self._op_rows.append(array("I"))
+        rows = self._op_rows[user_index]
+        if seq < len(rows):
+            rows[seq] = row
+        elif seq - len(rows) < MAX_SEQ_GAP:
+            rows.extend([NO_ROW] * (seq - len(rows)))
+            rows.append(row)
+        else:
+            self._sparse_op_rows[(user_index, seq)] = row
+
+    def find(self, user, seq):
+        """
+        linha da operação número `seq` do usuário.
+
+        Args:
+            user (str): usuário que fez a operação.
+            seq (int): número da operação.
+
+        Returns:
+            int | None: índice da linha, ou None se a operação não estiver no documento.
+        """
+        user_index = self.users.find(user)
+        if user_index is None or seq < 0:
+            return None
+        rows = self._op_rows[user_index] if user_index < len(self._op_rows) else ()
+        if seq < len(rows):
+            row = rows[seq]
+            return None if row == NO_ROW else row
+        return self._sparse_op_rows.get((user_index, seq))
+
+    def _track_stroke(self, row, user_index, tool, color_index, size):
+        """
+        junta o segmento ao traço aberto do usuário se ele continuar do ponto anterior.
+        """
+        if tool not in STROKE_TOOLS:
+            self._open_strokes.pop(user_index, None)
+            return
+
+        stroke = self._open_strokes.get(user_index)
+        last = stroke.stop - 1 if stroke else None
+        if (stroke and stroke.tool == tool and stroke.color == color_index and stroke.size == size
+                and self.x2[last] == self.x1[row] and self.y2[last] == self.y1[row]):
+            stroke.stop = row + 1
+            stroke.count += 1
+            return
+
+        stroke = Stroke(user_index, tool, color_index, size, row)
+        self.strokes.append(stroke)
+        self._open_strokes[user_index] = stroke
+
+    def row(self, index):
+        """
+        retorna uma linha como tupla (tool, user, seq, color, size, x1, y1, x2, y2, extra, t).
+        """
+        return (TOOLS[self.tool[index]], self.users[self.user[index]], self.seq[index],
+                self.colors[self.color[index]], self.size[index],
+                self.x1[index], self.y1[index], self.x2[index], self.y2[index],
+                self.extra.get(index), self.t[index])
+
+    def scan(self, start=0, stop=None, user=None):
+        """
+        percorre as linhas no intervalo [start, stop).
+
+        Args:
+            start (int): primeira linha.
+            stop (int | None): linha final (exclusiva). Por padrão, o fim do documento.
+            user (int | None): se informado, apenas linhas deste índice de usuário.
+
+        Yields:
+            tuple: o mesmo formato de row().
+        """
+        stop = len(self.tool) if stop is None else min(stop, len(self.tool))
+        for index in range(start, stop):
+            if user is None or self.user[index] == user:
+                yield self.row(index)
+
+    def stroke_rows(self, stroke):
+        """
+        percorre os segmentos de um traço.
+        """
+        return self.scan(stroke.start, stroke.stop, user=stroke.user)
+
+    def compact(self):
+        """
+        reescreve o documento apenas com o que está visível no canvas.
+
+        descarta tudo antes do último 'clear', aplica os 'move'/'scale' nas
+        coordenadas das operações selecionadas e remove as operações de controle.
+        a seleção atual de cada usuário é regravada no final como um único
+        'select', para que transformações feitas depois continuem valendo.
+
+        as linhas são renumeradas, então índices de linha guardados fora do
+        documento (ex: DrawingTools.row_items) deixam de valer.
+
+        Returns:
+            int: quantidade de linhas removidas.
+        """
+        with self._lock:
+            first = 0
+            for index in range(len(self.tool) - 1, -1, -1):
+                if TOOLS[self.tool[index]] == "clear":
+                    first = index + 1
+                    break
+
+            # (usuário, seq) -> linha, para resolver as seleções
+            rows_by_op = {}
+            # seleção atual de cada usuário (índice do usuário -> linhas)
+            selections = {}
+            # instante da última seleção de cada usuário
+            selected_at = {}
+            x1, y1 = array("f", self.x1), array("f", self.y1)
+            x2, y2 = array("f", self.x2), array("f", self.y2)
+            keep = []
+
+            for index in range(first, len(self.tool)):
+                tool = TOOLS[self.tool[index]]
+                user_index = self.user[index]
+                if tool == "select":
+                    ops = ((self.users.find(user), n) for user, n in decode_ranges(self.extra[index]))
+                    selections[user_index] = [rows_by_op[op] for op in ops if op in rows_by_op]
+                    selected_at[user_index] = self.t[index]
+                elif tool == "move":
+                    dx, dy = self.x1[index], self.y1[index]
+                    for row in selections.get(user_index, ()):
+                        x1[row] += dx
+                        y1[row] += dy
+                        x2[row] += dx
+                        y2[row] += dy
+                elif tool == "scale":
+                    ox, oy, factor = self.x1[index], self.y1[index], self.x2[index]
+                    for row in selections.get(user_index, ()):
+                        x1[row] = ox + (x1[row] - ox) * factor
+                        y1[row] = oy + (y1[row] - oy) * factor
+                        x2[row] = ox + (x2[row] - ox) * factor
+                        y2[row] = oy + (y2[row] - oy) * factor
+                elif tool not in CONTROL_TOOLS:
+                    rows_by_op[(user_index, self.seq[index])] = index
+                    keep.append(index)
+
+            compacted = Document()
+            for index in keep:
+                compacted.append(self.users[self.user[index]], TOOLS[self.tool[index]],
+                                 self.colors[self.color[index]], self.size[index],
+                                 x1[index], y1[index], x2[index], y2[index],
+                                 self.extra.get(index), self.seq[index], self.t[index])
+            for user_index, rows in selections.items():
+                if not rows:
+                    continue
+                ranges = encode_ranges((self.users[self.user[row]], self.seq[row]) for row in rows)
+                last_t = compacted.t[-1] if len(compacted) else 0.0
+                compacted.append(self.users[user_index], "select", extra=ranges,
+                                 t=max(selected_at[user_index], last_t))
+
+            removed = len(self.tool) - len(compacted)
+            for name in COLUMNS + ("extra", "users", "colors", "strokes", "_open_strokes",
+                                   "_op_rows", "_sparse_op_rows"):
+                setattr(self, name, getattr(compacted, name))
+            return removed
+
+    def save(self, path):
+        """
+        grava o documento em arquivo: uma linha JSON com as tabelas, seguida das colunas em binário.
+
+        Args:
+            path (str): caminho do arquivo.
+        """
+        with self._lock:
+            header = {
+                "rows": len(self.tool),
+                "columns": [[name, getattr(self, name).typecode] for name in COLUMNS],
+                "users": self.users.values,
+                "colors": self.colors.values,
+                "extra": {str(row): value for row, value in self.extra.items()},
+            }
+            with open(path, "wb") as f:
+                f.write(json.dumps(header).encode("utf-8") + b"\n")
+                for name in COLUMNS:
+                    f.write(getattr(self, name).tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """
+        lê um documento gravado por save().
+
+        Args:
+            path (str): caminho do arquivo.
+
+        Returns:
+            Document: o documento lido.
+        """
+        document = cls()
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            for name, typecode in header["columns"]:
+                column = array(typecode)
+                column.fromfile(f, header["rows"])
+                setattr(document, name, column)
+
+        for value in header["users"]:
+            document.users.intern(value)
+        for value in header["colors"]:
+            document.colors.intern(value)
+        document.extra = {int(row): value for row, value in header["extra"].items()}
+        for row in range(len(document.tool)):
+            document._track_stroke(row, document.user[row], TOOLS[document.tool[row]],
+                                   document.color[row], document.size[row])
+            if document.seq[row] != NO_SEQ:
+                document._index_op(row, document.user[row], document.seq[row])
+        return document
+
+    def memory_usage(self):
+        """
+        estima a memória ocupada pelo documento, em bytes.
+        """
+        total = sum(sys.getsizeof(getattr(self, name)) for name in COLUMNS)
+        total += sys.getsizeof(self.extra) + sum(sys.getsizeof(value) for value in self.extra.values())
+        total += sys.getsizeof(self.strokes) + len(self.strokes) * sys.getsizeof(Stroke(0, "pen", 0, 0, 0))
+        total += sum(sys.getsizeof(rows) for rows in self._op_rows) + sys.getsizeof(self._sparse_op_rows)
+        for table in (self.users, self.colors):
+            total += sys.getsizeof(table.values) + sum(sys.getsizeof(value) for value in table.values)
+        return total
+
+
+if __name__ == "__main__":
+    """
+    mede a memória por segmento de pincel.
+    """
+    segments = 100_000
+    document = Document()
+    for i in range(segments):
+        # traços de 500 segmentos, alternando entre dois usuários e duas cores
+        user = "alice" if (i // 500) % 2 else "bob"
+        color = "#000000" if (i // 1000) % 2 else "#FF0000"
+        document.append(user, "pen", color, 2, i % 800, i % 600, (i + 1) % 800, (i + 1) % 600, seq=i)
+
+    total = document.memory_usage()
+    print(f"{segments} segmentos, {len(document.strokes)} traços: "
+          f"{total / 1024:.1f} KiB ({total / segments:.1f} bytes por segmento)")
+
+    # o mesmo segmento como a lista de strings montada por DrawingTools.draw_line
+    as_strings = 0
+    for i in range(1000):
+        string_data = ["pen", "#000000", "2", str(i % 800), str(i % 600), str((i + 1) % 800), str((i + 1) % 600)]
+        as_strings += sys.getsizeof(string_data) + sum(sys.getsizeof(value) for value in string_data)
+    print(f"como lista de strings: {as_strings / 1000:.1f} bytes por segmento")
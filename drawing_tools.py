@@ -1,4 +1,10 @@
 import tkinter as tk
+from array import array
+from tkinter import filedialog
+
+from document import Document
+from image_tool import ImageManager
+from selection_tool import SelectionTool
 
 """
 Essa classe foi criada com auxilio de IA 
@@ -34,6 +40,32 @@ class DrawingTools:
         self.text_color = "#000000" # Default text color
 
         self.peer = peer
+        self.username = peer.username if peer else "local"
+
+        # --- Operation ids ---
+        # cada operação é identificada por (usuario, n); o número vai junto na mensagem,
+        # então os ids continuam iguais nos dois peers mesmo que um deles tenha desenhado
+        # antes de conectar ou tenha reconectado
+        self.next_seq = 0
+        # (usuario, n) -> linha vem do documento; aqui ficam só linha <-> item do canvas,
+        # em arrays (ids de itens e linhas são consecutivos). 0 = sem item/linha.
+        self.row_items = array("I")  # linha -> id do item no canvas
+        self.item_rows = array("I")  # id do item no canvas -> linha + 1
+        # imagens são registradas pela tag que agrupa os seus tiles
+        self.row_tags = {}  # linha -> tag
+        self.tag_rows = {}  # tag -> linha
+        # linhas anteriores ao último 'clear' não têm mais itens no canvas
+        self.first_row = 0
+
+        # --- Document ---
+        # registro compacto de todas as operações (desenhos, limpezas e transformações)
+        self.document = Document()
+
+        # --- For image tool ---
+        self.images = ImageManager(peer, self.register_op)
+
+        # --- For select tool ---
+        self.selection = SelectionTool(self)
 
     def set_color(self, color):
         """
@@ -56,16 +88,18 @@ class DrawingTools:
 
     def set_tool(self, tool_name):
         """
-        define a ferramenta ativa (pincel, borracha, linha, retângulo, círculo ou texto).
+        define a ferramenta ativa (pincel, borracha, linha, retângulo, círculo, texto, imagem ou seleção).
         Usado ao inicializar o programa
 
         Args:
             tool_name (str): nome da ferramenta.
         """
         self._cancel_text_entry()
+        if self.tool == "select" and tool_name != "select":
+            self.selection.clear()
 
         self.tool = tool_name
-        self.canvas.config(cursor="crosshair" if tool_name in ["pen", "eraser", "line", "rectangle", "circle", "text"] else "arrow")
+        self.canvas.config(cursor="crosshair" if tool_name in ["pen", "eraser", "line", "rectangle", "circle", "text", "image", "select"] else "arrow")
         self.start_x, self.start_y = None, None
 
     def _cancel_text_entry(self, event=''):
@@ -79,6 +113,73 @@ class DrawingTools:
             self.canvas.delete(self.text_entry_canvas_id)
             self.text_entry_canvas_id = None
 
+    def register_op(self, user, target, tool, color="", size=0, coords=(0, 0, 0, 0), extra=None, seq=None):
+        """
+        registra um item do canvas como operação de um usuário
+        e adiciona a operação ao documento.
+
+        Args:
+            user (str | None): usuário que fez a operação (None para o usuário local).
+            target (int | str | None): id do item ou tag que agrupa os itens da operação.
+                None quando a operação não gerou nenhum item.
+            tool (str): ferramenta usada.
+            color (str): cor do desenho.
+            size (int): tamanho do pincel ou fonte.
+            coords (tuple): coordenadas (x1, y1, x2, y2).
+            extra (str | None): texto digitado ou hash da imagem.
+            seq (int | None): número da operação recebido na mensagem. None para
+                operações locais, que recebem o próximo número deste peer.
+
+        Returns:
+            int: número da operação, que deve ser enviado junto com ela.
+        """
+        if user is None:
+            user = self.username
+            seq = self.next_seq
+            self.next_seq += 1
+        row = self.document.append(user, tool, color, size, *coords, extra=extra, seq=seq)
+        if isinstance(target, str):
+            self.row_tags[row] = target
+            self.tag_rows[target] = row
+        elif target is not None:
+            _put(self.row_items, row, target)
+            _put(self.item_rows, target, row + 1)
+        return seq
+
+    def item_of_op(self, op):
+        """
+        retorna o id do item (ou a tag) no canvas de uma operação, ou None.
+
+        Args:
+            op (tuple): id da operação (usuario, n).
+        """
+        row = self.document.find(*op)
+        if row is None or row < self.first_row:
+            return None
+        tag = self.row_tags.get(row)
+        if tag is not None:
+            return tag
+        item = self.row_items[row] if row < len(self.row_items) else 0
+        return item or None
+
+    def op_of_item(self, item):
+        """
+        retorna o id da operação (usuario, n) de um item do canvas, ou None.
+
+        Args:
+            item (int): id do item no canvas.
+        """
+        row = self.item_rows[item] - 1 if item < len(self.item_rows) else -1
+        if row < 0:
+            # itens de imagem são registrados pela tag da imagem
+            for tag in self.canvas.gettags(item):
+                row = self.tag_rows.get(tag, -1)
+                if row >= 0:
+                    break
+        if row < self.first_row:
+            return None
+        return self.document.users[self.document.user[row]], self.document.seq[row]
+
 
     def start_action(self, event):
         """
@@ -90,6 +191,9 @@ class DrawingTools:
         """
         self.start_x, self.start_y = event.x, event.y
 
+        if self.tool == "select":
+            self.selection.start(event)
+
         if self.tool in ["pen", "eraser"]:
             string_data = self.draw_line(self.start_x, self.start_y)
             msg = ":".join(string_data)
@@ -114,6 +218,13 @@ class DrawingTools:
             # Bind Escape key to cancel text entry
             self.text_entry_widget.bind("<Escape>", self._cancel_text_entry)
 
+        elif self.tool == "image":
+            path = filedialog.askopenfilename(title="Escolha uma imagem",
+                                              filetypes=[("Imagens", "*.png *.jpg *.jpeg *.bmp *.gif *.tif *.tiff *.webp"),
+                                                         ("Todos os arquivos", "*.*")])
+            if path:
+                self.images.place_local(path, event.x, event.y)
+            self.start_x, self.start_y = None, None
 
     def apply_remote_action(self, message):
         """
@@ -125,11 +236,12 @@ class DrawingTools:
 
         a mensagem deve estar no formato separado por ':':
 
-            <username>:<tool>:<color>:<size>:<x1>:<y1>:<x2>:<y2>:<extra_data>
+            <username>:<tool>:<seq>:<color>:<size>:<x1>:<y1>:<x2>:<y2>:<extra_data>
 
         onde:
             - username: nome do usuário que enviou a ação
             - tool: ferramenta usada ('line', 'rectangle', 'circle', 'pen', 'eraser', 'text')
+            - seq: número da operação do usuário (ver register_op)
             - color: cor do desenho/texto
             - size: tamanho do pincel ou fonte
             - x1, y1: coordenadas iniciais
@@ -152,53 +264,66 @@ class DrawingTools:
         Args:
             message (str): mensagem recebida contendo os dados da ação.
         """
+        item = None
         try:
             parts = message.split(':')
             tool = parts[1].strip()
-            color = parts[2]
-            x1 = int(parts[4])
-            y1 = int(parts[5])
-            size = int(parts[3])
+            seq = int(parts[2])
+            color = parts[3]
+            x1 = int(parts[5])
+            y1 = int(parts[6])
+            size = int(parts[4])
             if tool != "text":
-                x2 = int(parts[6])
-                y2 = int(parts[7])
+                x2 = int(parts[7])
+                y2 = int(parts[8])
+                coords, extra_data = (x1, y1, x2, y2), None
             else:
-                extra_data = ':'.join(parts[6:]).strip()
+                extra_data = ':'.join(parts[7:]).strip()
+                coords = (x1, y1, 0, 0)
 
             if tool == "line":
 
-                self.canvas.create_line(x1, y1, x2, y2, fill=color, width=size,
-                                            capstyle=tk.ROUND, smooth=tk.TRUE, tags="drawn_item")
+                item = self.canvas.create_line(x1, y1, x2, y2, fill=color, width=size,
+                                               capstyle=tk.ROUND, smooth=tk.TRUE, tags="drawn_item")
 
             elif tool == "rectangle":
 
                 bbox = [min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)]
-                self.canvas.create_rectangle(bbox[0], bbox[1], bbox[2], bbox[3],
-                                             outline=color, width=size, tags="drawn_item")
+                item = self.canvas.create_rectangle(bbox[0], bbox[1], bbox[2], bbox[3],
+                                                    outline=color, width=size, tags="drawn_item")
 
             elif tool == "circle":
 
                 bbox = [min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)]
-                self.canvas.create_oval(bbox, outline=color, width=size, tags="drawn_item")
+                item = self.canvas.create_oval(bbox, outline=color, width=size, tags="drawn_item")
 
             elif tool == "pen":
-                self.canvas.create_line(x1, y1, x2, y2, fill=color, width=size,
-                                        capstyle=tk.ROUND, smooth=tk.TRUE, tags="drawn_item")
+                item = self.canvas.create_line(x1, y1, x2, y2, fill=color, width=size,
+                                               capstyle=tk.ROUND, smooth=tk.TRUE, tags="drawn_item")
 
             elif tool == "eraser":
 
-                self.canvas.create_line(x1, y1, x2, y2, fill="white", width=size * 2,
-                                       capstyle=tk.ROUND, smooth=tk.TRUE, tags="drawn_item")
+                item = self.canvas.create_line(x1, y1, x2, y2, fill="white", width=size * 2,
+                                               capstyle=tk.ROUND, smooth=tk.TRUE, tags="drawn_item")
 
             elif tool == "text":
                 text_content = extra_data
                 if text_content:
                     font_size = max(1, size)
-                    self.canvas.create_text(x1, y1, text=text_content, anchor=tk.NW,
-                                            font=(self.text_font, font_size),  fill=color, tags="drawn_item")
+                    item = self.canvas.create_text(x1, y1, text=text_content, anchor=tk.NW,
+                                                   font=(self.text_font, font_size),  fill=color, tags="drawn_item")
+
+            else:
+                # ferramenta desconhecida: ignorada, como antes, e fora do documento
+                return
+
+            self.register_op(parts[0], item, tool, color, size, coords, extra_data, seq)
 
         except Exception as e:
             print(f"Erro ao aplicar ação remota: {e}. Mensagem: '{message}'")
+            # o que não entrou no documento também não fica no canvas
+            if item is not None:
+                self.canvas.delete(item)
 
 
     def perform_action(self, event):
@@ -215,7 +340,10 @@ class DrawingTools:
         if self.start_x is None or self.start_y is None:
             return
 
-        if self.tool in ["pen", "eraser"]:
+        if self.tool == "select":
+            self.selection.drag(event)
+
+        elif self.tool in ["pen", "eraser"]:
             string_data = self.draw_line(x, y)
             msg = ":".join(string_data)
             if self.peer:
@@ -239,11 +367,16 @@ class DrawingTools:
         if self.start_x is None or self.start_y is None: # No drawing started
             return
 
-        if self.tool in ["pen", "eraser"]:
+        if self.tool == "select":
+            self.selection.end(event)
+        elif self.tool in ["pen", "eraser"]:
             pass # Handled in perform_action
         elif self.tool in ["line", "rectangle", "circle"]:
             self.canvas.delete(self.id_last_shape)
             string_data = self.draw_shapes(x, y)
+            seq = self.register_op(None, self.id_last_shape, self.tool, self.pen_color, self.pen_size,
+                                   tuple(int(value) for value in string_data[3:7]))
+            string_data.insert(1, str(seq))
             msg = ":".join(string_data)
             self.id_last_shape = None
             if self.peer:
@@ -276,10 +409,12 @@ class DrawingTools:
                 font_size = max(8, self.pen_size)
 
 
-                self.canvas.create_text(x, y, text=text_content, anchor=tk.NW,
-                                        font=(self.text_font, font_size), fill=self.text_color,
-                                        tags="drawn_item")
-                string_data = [str(self.tool), str(self.pen_color), str(font_size), str(x), str(y), str(text_content)]
+                item = self.canvas.create_text(x, y, text=text_content, anchor=tk.NW,
+                                               font=(self.text_font, font_size), fill=self.text_color,
+                                               tags="drawn_item")
+                seq = self.register_op(None, item, self.tool, self.pen_color, font_size, (x, y, 0, 0), text_content)
+                string_data = [str(self.tool), str(seq), str(self.pen_color), str(font_size), str(x), str(y),
+                               str(text_content)]
                 msg = ":".join(string_data)
 
                 if self.peer:
@@ -287,11 +422,19 @@ class DrawingTools:
 
             self._cancel_text_entry()
 
-    def clear_canvas(self):
+    def clear_canvas(self, user=None):
         """
         limpa canvas.
+
+        Args:
+            user (str | None): usuário que pediu a limpeza (None para o usuário local).
         """
         self.canvas.delete("all")
+        self.first_row = self.document.append(user or self.username, "clear") + 1
+        self.images.clear()
+        self.selection.clear()
+        self.row_tags.clear()
+        self.tag_rows.clear()
 
     def send_clear(self):
         """
@@ -311,19 +454,23 @@ class DrawingTools:
         """
         string_data = ""
         if self.tool == "pen":
-            self.canvas.create_line(self.start_x, self.start_y, x, y,
-                                    fill=self.pen_color, width=self.pen_size,
-                                    capstyle=tk.ROUND, smooth=tk.TRUE, tags="drawn_item")
-
-            string_data = [self.tool, self.pen_color, str(self.pen_size), str(self.start_x), str(self.start_y), str(x),
-                           str(y)]
+            item = self.canvas.create_line(self.start_x, self.start_y, x, y,
+                                           fill=self.pen_color, width=self.pen_size,
+                                           capstyle=tk.ROUND, smooth=tk.TRUE, tags="drawn_item")
+            seq = self.register_op(None, item, self.tool, self.pen_color, self.pen_size,
+                                   (self.start_x, self.start_y, x, y))
+
+            string_data = [self.tool, str(seq), self.pen_color, str(self.pen_size), str(self.start_x),
+                           str(self.start_y), str(x), str(y)]
             self.start_x, self.start_y = x, y
         elif self.tool == "eraser":
-            self.canvas.create_line(self.start_x, self.start_y, x, y,
-                                    fill="white", width=self.pen_size * 2,
-                                    capstyle=tk.ROUND, smooth=tk.TRUE, tags="drawn_item")
-            string_data = [self.tool, self.pen_color, str(self.pen_size), str(self.start_x), str(self.start_y), str(x),
-                           str(y)]
+            item = self.canvas.create_line(self.start_x, self.start_y, x, y,
+                                           fill="white", width=self.pen_size * 2,
+                                           capstyle=tk.ROUND, smooth=tk.TRUE, tags="drawn_item")
+            seq = self.register_op(None, item, self.tool, self.pen_color, self.pen_size,
+                                   (self.start_x, self.start_y, x, y))
+            string_data = [self.tool, str(seq), self.pen_color, str(self.pen_size), str(self.start_x),
+                           str(self.start_y), str(x), str(y)]
             self.start_x, self.start_y = x, y
         return string_data
 
@@ -356,4 +503,13 @@ class DrawingTools:
             string_data = [self.tool, self.pen_color, str(self.pen_size), str(bbox[0]), str(bbox[1]),
                            str(bbox[2]), str(bbox[3])]
 
-        return string_data
\ No newline at end of file
+        return string_data
+
+
+def _put(column, index, value):
+    """
+    grava value em column[index], aumentando o array com zeros se necessário.
+    """
+    if index >= len(column):
+        column.frombytes(bytes(column.itemsize * (index + 1 - len(column))))
+    column[index] = value
@@ -0,0 +1,593 @@
+import base64
+import hashlib
+import itertools
+import os
+import queue
+import re
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+
+from PIL import Image, ImageTk
+
+# lado (em pixels de tela) de cada tile materializado no canvas
+TILE_SIZE = 256
+# maior lado da imagem base da pirâmide; imagens maiores são reduzidas ao carregar
+MAX_BASE_SIDE = 4096
+# limite de memória do cache de tiles (PhotoImage em RGBA => 4 bytes por pixel)
+CACHE_LIMIT_BYTES = 64 * 1024 * 1024
+# tamanho em bytes de cada pedaço da imagem enviado pela rede (antes do base64)
+CHUNK_SIZE = 48 * 1024
+# maior arquivo de imagem aceito, importado ou recebido pela rede
+MAX_FILE_SIZE = 64 * 1024 * 1024
+# quantidade máxima de pedaços de uma imagem
+MAX_CHUNKS = -(-MAX_FILE_SIZE // CHUNK_SIZE)
+# quantidade máxima de imagens sendo recebidas ao mesmo tempo
+MAX_PENDING_IMAGES = 4
+# formato do hash sha256 em hexadecimal, que também é o nome do arquivo no cache
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+# intervalo em ms com que a thread do Tk processa os resultados da thread de trabalho
+POLL_MS = 50
+
+
+class ImageStore:
+    """
+    armazena as imagens recebidas/importadas em disco, indexadas pelo hash sha256 do conteúdo.
+
+    como o nome do arquivo é o próprio hash, uma imagem já conhecida nunca é
+    baixada novamente do outro peer.
+    """
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory (str | None): pasta do cache. Por padrão usa a pasta temporária do sistema.
+        """
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "paintpy_images")
+        os.makedirs(self.directory, exist_ok=True)
+        # pedaços ainda incompletos: hash -> lista de pedaços (None enquanto não chegou)
+        self._partial = {}
+        self._lock = threading.Lock()
+
+    def path(self, digest):
+        """
+        retorna o caminho do arquivo de uma imagem no cache.
+
+        o hash vem da rede, então qualquer coisa que não seja um sha256 é
+        recusada antes de virar caminho (ex: "/etc/hostname" ou "../x").
+        """
+        if not DIGEST_PATTERN.match(digest):
+            raise ValueError(f"hash de imagem inválido: {digest!r}")
+        return os.path.join(self.directory, digest)
+
+    def has(self, digest):
+        """
+        verifica se a imagem já está no cache.
+        """
+        return os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """
+        salva o conteúdo de uma imagem no cache.
+
+        Args:
+            data (bytes): conteúdo do arquivo de imagem.
+
+        Returns:
+            str: hash sha256 do conteúdo.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.has(digest):
+            # escreve em arquivo temporário e renomeia para nunca expor um arquivo pela metade
+            tmp_path = self.path(digest) + ".part"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(digest))
+        return digest
+
+    def chunks(self, digest):
+        """
+        gera os pedaços da imagem codificados em base64, prontos para envio.
+
+        Yields:
+            tuple: (indice, total, dados_base64).
+        """
+        size = os.path.getsize(self.path(digest))
+        total = max(1, -(-size // CHUNK_SIZE))
+        with open(self.path(digest), "rb") as f:
+            for index in range(total):
+                yield index, total, base64.b64encode(f.read(CHUNK_SIZE)).decode("ascii")
+
+    def add_chunk(self, digest, index, total, payload):
+        """
+        adiciona um pedaço recebido da rede.
+
+        Args:
+            digest (str): hash da imagem.
+            index (int): posição do pedaço.
+            total (int): quantidade total de pedaços.
+            payload (str): dados do pedaço em base64.
+
+        Returns:
+            bool: true quando a imagem ficou completa e foi salva no cache.
+
+        Raises:
+            ValueError: pedaço fora do intervalo, base64 inválido ou hash que não confere.
+        """
+        if not 0 <= index < total <= MAX_CHUNKS:
+            raise ValueError(f"pedaço {index}/{total} inválido para a imagem {digest}")
+        self.path(digest)  # valida o hash
+        data = base64.b64decode(payload, validate=True)
+        if len(data) > CHUNK_SIZE:
+            raise ValueError(f"pedaço {index} maior que {CHUNK_SIZE} bytes")
+
+        with self._lock:
+            parts = self._partial.get(digest)
+            if parts is None:
+                if len(self._partial) >= MAX_PENDING_IMAGES:
+                    raise ValueError(f"já há {MAX_PENDING_IMAGES} imagens sendo recebidas")
+                parts = self._partial[digest] = [None] * total
+            if len(parts) != total:
+                raise ValueError(f"total de pedaços mudou para a imagem {digest}")
+            parts[index] = data
+            if any(part is None for part in parts):
+                return False
+            del self._partial[digest]
+
+        data = b"".join(parts)
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"hash não confere para a imagem {digest}")
+        self.put(data)
+        return True
+
+    def discard_partial(self, digest):
+        """
+        descarta os pedaços já recebidos de uma imagem incompleta.
+        """
+        with self._lock:
+            self._partial.pop(digest, None)
+
+
+class TileCache:
+    """
+    cache LRU de tiles já convertidos em PhotoImage, limitado por memória.
+
+    tiles que estão sendo exibidos no canvas ficam "presos" e não são
+    descartados, pois o Tk precisa da referência viva do PhotoImage. Camadas
+    com a mesma imagem e o mesmo tamanho compartilham tiles, então cada tile
+    conta quantas vezes está preso.
+    """
+    def __init__(self, limit_bytes=CACHE_LIMIT_BYTES):
+        self.limit_bytes = limit_bytes
+        self.used_bytes = 0
+        self._tiles = OrderedDict()
+        # chave -> quantidade de itens do canvas exibindo o tile
+        self._pinned = Counter()
+
+    def get(self, key):
+        photo = self._tiles.get(key)
+        if photo is not None:
+            self._tiles.move_to_end(key)
+        return photo
+
+    def put(self, key, photo):
+        if key in self._tiles:
+            return
+        self._tiles[key] = photo
+        self.used_bytes += photo.width() * photo.height() * 4
+        self._evict()
+
+    def pin(self, key):
+        self._pinned[key] += 1
+
+    def unpin(self, key):
+        if self._pinned[key] <= 1:
+            del self._pinned[key]
+        else:
+            self._pinned[key] -= 1
+
+    def unpin_all(self):
+        self._pinned.clear()
+        self._evict()
+
+    def _evict(self):
+        """
+        descarta os tiles menos usados até voltar ao limite de memória.
+        """
+        for key in list(self._tiles):
+            if self.used_bytes <= self.limit_bytes:
+                break
+            if key in self._pinned:
+                continue
+            photo = self._tiles.pop(key)
+            self.used_bytes -= photo.width() * photo.height() * 4
+
+
+class ImagePyramid:
+    """
+    pirâmide de resoluções (mipmaps) de uma imagem.
+
+    o nível 0 é a imagem base (limitada a MAX_BASE_SIDE) e cada nível seguinte
+    tem metade da largura e da altura do anterior.
+    """
+    def __init__(self, path):
+        """
+        carrega a imagem e gera os níveis. Deve rodar fora da thread do Tk.
+
+        Args:
+            path (str): caminho do arquivo de imagem.
+        """
+        image = Image.open(path)
+        # para JPEG o decoder já reduz a imagem enquanto lê, sem alocar a resolução cheia
+        image.draft("RGB", (MAX_BASE_SIDE, MAX_BASE_SIDE))
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        if max(image.size) > MAX_BASE_SIDE:
+            image.thumbnail((MAX_BASE_SIDE, MAX_BASE_SIDE), Image.LANCZOS)
+
+        self.levels = [image]
+        while max(self.levels[-1].size) > TILE_SIZE:
+            self.levels.append(self.levels[-1].reduce(2))
+
+    @property
+    def size(self):
+        return self.levels[0].size
+
+    def render_tile(self, width, height, tx, ty):
+        """
+        gera um tile da imagem exibida com o tamanho (width, height).
+
+        usa o menor nível da pirâmide que ainda tenha resolução suficiente,
+        então o custo não depende do tamanho da imagem original.
+
+        Args:
+            width (int): largura da imagem exibida no canvas.
+            height (int): altura da imagem exibida no canvas.
+            tx (int): coluna do tile.
+            ty (int): linha do tile.
+
+        Returns:
+            PIL.Image.Image: tile pronto para virar PhotoImage.
+        """
+        level = self._level(width, height)
+        fx = level.width / width
+        fy = level.height / height
+        x0, y0 = tx * TILE_SIZE, ty * TILE_SIZE
+        x1, y1 = min(x0 + TILE_SIZE, width), min(y0 + TILE_SIZE, height)
+        return level.resize((x1 - x0, y1 - y0), Image.BILINEAR,
+                            box=(x0 * fx, y0 * fy, x1 * fx, y1 * fy))
+
+    def render(self, width, height):
+        """
+        gera a imagem inteira no tamanho (width, height), a partir do menor nível suficiente.
+        """
+        return self._level(width, height).resize((width, height), Image.BILINEAR)
+
+    def _level(self, width, height):
+        """
+        menor nível da pirâmide com pelo menos (width, height) pixels.
+        """
+        for level in reversed(self.levels):
+            if level.width >= width and level.height >= height:
+                return level
+        return self.levels[0]
+
+
+class ImageLayer:
+    """
+    uma imagem posicionada no canvas.
+
+    a posição e o tamanho de exibição vêm do retângulo invisível "anchor", então
+    a imagem acompanha canvas.move/canvas.scale aplicados à sua tag.
+    """
+    def __init__(self, digest, x, y, width, height, anchor_id, tag):
+        self.digest = digest
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        self.pyramid = None
+        # item invisível que marca a posição da imagem na pilha do canvas
+        self.anchor_id = anchor_id
+        # tag comum ao anchor e a todos os tiles da imagem
+        self.tag = tag
+        # tiles exibidos: (tx, ty) -> id do item no canvas
+        self.items = {}
+        # tiles já pedidos para a thread de trabalho
+        self.pending = set()
+
+    def tile_key(self, tx, ty, size=None):
+        width, height = size or (self.width, self.height)
+        return self.digest, width, height, tx, ty
+
+
+class ImageManager:
+    """
+    ferramenta de importação de imagens para o canvas.
+
+    o carregamento e a geração da pirâmide e dos tiles rodam em uma thread de
+    trabalho; a thread do Tk apenas converte os tiles prontos em PhotoImage e
+    cria os itens do canvas, somente para a área visível.
+
+    mensagens trocadas com o outro peer:
+        - image:<hash>:<x>:<y>:<largura>:<altura>:<n>  → posiciona a imagem (operação número n do usuário)
+        - imgwant:<hash>                               → pede o conteúdo de uma imagem desconhecida
+        - imgchunk:<hash>:<i>:<total>:<base64>         → um pedaço do conteúdo
+    """
+    def __init__(self, peer, register_op, store=None):
+        """
+        Args:
+            peer (Peer): objeto responsável pela comunicação em rede.
+            register_op (callable): registra a tag de uma imagem como operação de um usuário
+                (ver DrawingTools.register_op).
+            store (ImageStore | None): cache de imagens em disco.
+        """
+        self.peer = peer
+        self.register_op = register_op
+        self.canvas = None
+        self.store = store or ImageStore()
+        self.cache = TileCache()
+        self.layers = []
+        # pirâmides já carregadas, compartilhadas entre camadas com o mesmo hash
+        self._pyramids = {}
+        # hashes já pedidos ao outro peer e ainda não recebidos
+        self._requested = set()
+        self._tag_counter = itertools.count()
+
+        # trabalhos para a thread de trabalho e resultados para a thread do Tk
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        worker = threading.Thread(target=self._work)
+        worker.daemon = True
+        worker.start()
+
+    def attach(self, canvas):
+        """
+        associa o canvas e começa a processar os resultados na thread do Tk.
+
+        Args:
+            canvas (tk.Canvas): área de desenho principal.
+        """
+        self.canvas = canvas
+        self.canvas.bind("<Configure>", lambda event: self.refresh(), add="+")
+        self.canvas.after(POLL_MS, self._poll)
+
+    def place_local(self, path, x, y):
+        """
+        importa uma imagem local na posição (x, y) e a envia ao outro peer.
+
+        Args:
+            path (str): caminho do arquivo de imagem.
+            x (int): posição X do canto superior esquerdo.
+            y (int): posição Y do canto superior esquerdo.
+        """
+        self._jobs.put(("import", path, x, y))
+
+    def request_refresh(self):
+        """
+        pede um refresh a partir de qualquer thread; ele roda na thread do Tk.
+        """
+        self._results.put(("refresh",))
+
+    def handle_message(self, user, kind, parts):
+        """
+        trata as mensagens de imagem recebidas do outro peer (roda na thread do socket).
+
+        Args:
+            user (str): usuário que enviou a mensagem.
+            kind (str): tipo da mensagem ('image', 'imgwant' ou 'imgchunk').
+            parts (list[str]): campos da mensagem após o tipo.
+        """
+        digest = parts[0].strip()
+        # o hash vira nome de arquivo: nada que não seja um sha256 chega ao store
+        if not DIGEST_PATTERN.match(digest):
+            print(f"Mensagem de imagem com hash inválido ignorada: {digest!r}")
+            return
+        try:
+            self._handle(user, kind, digest, parts)
+        except Exception as e:
+            print(f"Erro ao tratar mensagem de imagem: {e}")
+
+    def _handle(self, user, kind, digest, parts):
+        if kind == "image":
+            x, y, width, height, seq = (int(value) for value in parts[1:6])
+            tag = self._new_tag()
+            self.register_op(user, tag, "image", "", 0, (x, y, x + width, y + height), digest, seq)
+            self._results.put(("place", digest, x, y, width, height, tag))
+            if not self.store.has(digest) and digest not in self._requested:
+                self._requested.add(digest)
+                self._send(f"imgwant:{digest}")
+
+        elif kind == "imgwant":
+            if self.store.has(digest):
+                thread = threading.Thread(target=self._send_chunks, args=(digest,))
+                thread.daemon = True
+                thread.start()
+
+        elif kind == "imgchunk":
+            # só aceita pedaços de imagens que foram pedidas
+            if digest not in self._requested:
+                return
+            try:
+                complete = self.store.add_chunk(digest, int(parts[1]), int(parts[2]), parts[3].strip())
+            except Exception:
+                # permite pedir a imagem de novo quando ela for posicionada outra vez
+                self._requested.discard(digest)
+                self.store.discard_partial(digest)
+                raise
+            if complete:
+                self._requested.discard(digest)
+                self._jobs.put(("load", digest))
+
+    def clear(self):
+        """
+        esquece as imagens posicionadas (os itens já foram apagados do canvas).
+        """
+        self.layers = []
+        self.cache.unpin_all()
+
+    def refresh(self):
+        """
+        materializa os tiles visíveis e remove os que saíram da área visível.
+        """
+        if self.canvas is None:
+            return
+        left, top = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        right = left + self.canvas.winfo_width()
+        bottom = top + self.canvas.winfo_height()
+
+        for layer in self.layers:
+            if layer.pyramid is None:
+                continue
+            self._sync_geometry(layer)
+            visible = set()
+            tx0 = max(0, int((left - layer.x) // TILE_SIZE))
+            ty0 = max(0, int((top - layer.y) // TILE_SIZE))
+            tx1 = min(-(-layer.width // TILE_SIZE), int((right - layer.x) // TILE_SIZE) + 1)
+            ty1 = min(-(-layer.height // TILE_SIZE), int((bottom - layer.y) // TILE_SIZE) + 1)
+            for ty in range(ty0, ty1):
+                for tx in range(tx0, tx1):
+                    visible.add((tx, ty))
+
+            for tile in list(layer.items):
+                if tile not in visible:
+                    self.canvas.delete(layer.items.pop(tile))
+                    self.cache.unpin(layer.tile_key(*tile))
+
+            for tile in visible:
+                if tile in layer.items:
+                    continue
+                photo = self.cache.get(layer.tile_key(*tile))
+                if photo is not None:
+                    self._show_tile(layer, tile, photo)
+                elif tile not in layer.pending:
+                    layer.pending.add(tile)
+                    self._jobs.put(("tile", layer, tile, (layer.width, layer.height)))
+
+    def _sync_geometry(self, layer):
+        """
+        atualiza posição e tamanho da camada a partir do anchor.
+
+        se o tamanho mudou (escala), os tiles antigos são descartados e gerados de novo.
+        """
+        x0, y0, x1, y1 = self.canvas.coords(layer.anchor_id)
+        width, height = max(1, round(x1 - x0)), max(1, round(y1 - y0))
+        if (width, height) != (layer.width, layer.height):
+            for tile, item in layer.items.items():
+                self.canvas.delete(item)
+                self.cache.unpin(layer.tile_key(*tile))
+            layer.items = {}
+            layer.width, layer.height = width, height
+        layer.x, layer.y = x0, y0
+
+    def _show_tile(self, layer, tile, photo):
+        tx, ty = tile
+        key = layer.tile_key(tx, ty)
+        self.cache.pin(key)
+        # copia as tags do anchor, incluindo a de seleção, se a imagem estiver selecionada
+        item = self.canvas.create_image(layer.x + tx * TILE_SIZE, layer.y + ty * TILE_SIZE,
+                                        image=photo, anchor="nw",
+                                        tags=self.canvas.gettags(layer.anchor_id))
+        # mantém o tile na mesma altura da pilha em que a imagem foi colocada
+        self.canvas.tag_raise(item, layer.anchor_id)
+        layer.items[tile] = item
+
+    def _add_layer(self, digest, x, y, width, height, tag):
+        anchor_id = self.canvas.create_rectangle(x, y, x + width, y + height, outline="",
+                                                 tags=("drawn_item", tag))
+        layer = ImageLayer(digest, x, y, width, height, anchor_id, tag)
+        self.layers.append(layer)
+        if digest in self._pyramids:
+            layer.pyramid = self._pyramids[digest]
+            self.refresh()
+        elif self.store.has(digest):
+            self._jobs.put(("load", digest))
+        return layer
+
+    def _poll(self):
+        """
+        processa na thread do Tk os resultados produzidos pela thread de trabalho.
+        """
+        try:
+            while True:
+                result = self._results.get_nowait()
+                kind = result[0]
+                if kind == "imported":
+                    _, digest, x, y, pyramid = result
+                    self._pyramids[digest] = pyramid
+                    width, height = self._fit(pyramid.size)
+                    tag = self._new_tag()
+                    seq = self.register_op(None, tag, "image", "", 0, (x, y, x + width, y + height), digest)
+                    self._add_layer(digest, x, y, width, height, tag)
+                    self._send(f"image:{digest}:{x}:{y}:{width}:{height}:{seq}")
+
+                elif kind == "place":
+                    self._add_layer(*result[1:])
+
+                elif kind == "loaded":
+                    _, digest, pyramid = result
+                    self._pyramids[digest] = pyramid
+                    for layer in self.layers:
+                        if layer.digest == digest:
+                            layer.pyramid = pyramid
+                    self.refresh()
+
+                elif kind == "refresh":
+                    self.refresh()
+
+                elif kind == "tile":
+                    _, layer, tile, size, image = result
+                    layer.pending.discard(tile)
+                    photo = ImageTk.PhotoImage(image)
+                    self.cache.put(layer.tile_key(*tile, size=size), photo)
+                    # a camada pode ter sido apagada ou escalada enquanto o tile era gerado
+                    if layer in self.layers and tile not in layer.items and size == (layer.width, layer.height):
+                        self._show_tile(layer, tile, photo)
+        except queue.Empty:
+            pass
+        self.canvas.after(POLL_MS, self._poll)
+
+    def _work(self):
+        """
+        laço da thread de trabalho: carrega imagens e gera tiles.
+        """
+        while True:
+            job = self._jobs.get()
+            try:
+                if job[0] == "import":
+                    _, path, x, y = job
+                    if os.path.getsize(path) > MAX_FILE_SIZE:
+                        raise ValueError(f"imagem maior que {MAX_FILE_SIZE // (1024 * 1024)} MB")
+                    with open(path, "rb") as f:
+                        digest = self.store.put(f.read())
+                    pyramid = self._pyramids.get(digest) or ImagePyramid(self.store.path(digest))
+                    self._results.put(("imported", digest, x, y, pyramid))
+
+                elif job[0] == "load":
+                    digest = job[1]
+                    if digest not in self._pyramids:
+                        self._results.put(("loaded", digest, ImagePyramid(self.store.path(digest))))
+
+                elif job[0] == "tile":
+                    _, layer, tile, size = job
+                    image = layer.pyramid.render_tile(*size, *tile)
+                    self._results.put(("tile", layer, tile, size, image))
+            except Exception as e:
+                print(f"Erro ao processar imagem: {e}")
+
+    def _fit(self, size):
+        """
+        calcula o tamanho de exibição para que a imagem caiba no canvas.
+        """
+        width, height = size
+        max_width = max(1, self.canvas.winfo_width())
+        max_height = max(1, self.canvas.winfo_height())
+        scale = min(1.0, max_width / width, max_height / height)
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def _new_tag(self):
+        return f"image_{next(self._tag_counter)}"
+
+    def _send_chunks(self, digest):
+        for index, total, payload in self.store.chunks(digest):
+            self._send(f"imgchunk:{digest}:{index}:{total}:{payload}")
+
+    def _send(self, msg):
+        if self.peer:
+            self.peer.envia_mensagem(msg)
@@ -1,6 +1,7 @@
 import tkinter as tk
 from ui import PaintUI
 from drawing_tools import DrawingTools
+from diagnostics import Diagnostics
 
 """
 Essa classe foi criada com auxílio de IA
@@ -11,11 +12,12 @@ conforme descrito na sessão 7 da documentação
 app_instance = None
 
 class PaintApp:
-    def __init__(self, root, peer):
+    def __init__(self, root, peer, diagnostics=None):
         """
        inicializa a aplicação.
        :param root: janela principal do Tkinter.
        :param peer: objeto responsável pela comunicação em rede (pode ser None se rodando localmente).
+       :param diagnostics: modo de diagnóstico opcional (None no modo normal).
        """
         self.root = root
         self.root.title("Paint Colaborativo")
@@ -25,11 +27,16 @@ class PaintApp:
 
         self.drawing_tools = DrawingTools(None, peer)
 
+        # os handlers precisam ser cronometrados antes de a interface fazer os binds
+        if diagnostics:
+            diagnostics.instrument(self.drawing_tools, peer)
+
         # cria a interface gráfica (menus, botões, área de desenho, etc.)
         self.ui = PaintUI(root, self.drawing_tools, peer)
 
         # agora que o canvas foi criado pelo UI, associamos ao DrawingTools
         self.drawing_tools.canvas = self.ui.canvas
+        self.drawing_tools.images.attach(self.ui.canvas)
 
         # define a ferramenta inicial de desenho
         self.drawing_tools.set_tool("pen")
@@ -41,10 +48,16 @@ def main(peer=None):
     :param peer: objeto opcional de rede usado para sincronizar desenhos entre os usuários.
     """
     root = tk.Tk()
-    app_instance = PaintApp(root, peer)
+    # ligado com a variável de ambiente PAINTPY_DIAGNOSTICS=1
+    diagnostics = Diagnostics.from_env(root)
+    app_instance = PaintApp(root, peer, diagnostics)
     if peer:
         peer.drawingTools = app_instance.drawing_tools
+    if diagnostics:
+        diagnostics.start()
     root.mainloop()
+    if diagnostics:
+        diagnostics.stop()
     print("Terminou a main")
     if peer:
         peer.envia_mensagem(f"fechar: Fechou a conexao")
@@ -1,8 +1,11 @@
+import atexit
+import os
 import socket
 import threading
 from logging import exception
 
 import main as m
+import shm_transport
 
 """
 Essa classe foi criada com auxilio de IA, onde 
@@ -53,6 +56,19 @@ class Peer:
         # drawingTools inicial
         self.drawingTools = None
 
+        # garante que mensagens enviadas por threads diferentes não se misturem no socket
+        self.send_lock = threading.Lock()
+
+        # transporte por memória compartilhada com peers na mesma máquina:
+        # anel onde este peer escreve (criado na primeira conexão)
+        self.shm_ring = None
+        # sockets dos peers que já leem as nossas mensagens pelo anel
+        self.shm_peers = set()
+        # consumidores dos anéis dos outros peers, até o peer avisar que trocou de transporte
+        self.shm_consumers = {}
+        # consumidores já em uso, cada um lido por uma thread recebe_shm
+        self.shm_readers = {}
+
     def escuta(self):
         """
         inicia o modo de escuta do servidor, aguardando novas conexões.
@@ -82,6 +98,7 @@ class Peer:
                 thread = threading.Thread(target=self.recebe_mensagem, args=(conn, endereco))
                 thread.daemon = True  # Permite que o programa principal saia mesmo com threads ativas
                 thread.start()
+                self.oferece_shm(conn)
 
             except Exception as e:
                 print(f"[{self.username}] Erro ao aceitar conexões: {e}")
@@ -95,18 +112,13 @@ class Peer:
         Args:
             peer_socket (socket.socket): socket do peer.
             endereco (tuple): endereço (IP, porta) do peer conectado.
-
-        tipos de mensagens esperadas:
-        - "<usuario>:msg:<texto>" → exibe mensagem de chat.
-        - "<usuario>:clear" → limpa o canvas.
-        - outros → aplicam ações de desenho remoto.
         """
         # buffer para receber a mensagem decodificada e guardar resto de mensagem que podem vir no próximo pacote
         buffer = ""
         while True:
             try:
                 # mensagem em binário
-                data = peer_socket.recv(2048)
+                data = peer_socket.recv(65536)
                 # se a conexão for fechada pelo outro peer
                 if not data:
                     raise Exception("Peer desconectado")
@@ -118,47 +130,171 @@ class Peer:
                 while '\n' in buffer:
                     # separa a primeira mensagem completa ('\n') do resto do buffer
                     messagem, buffer = buffer.split('\n', 1)
+                    if not self.processa_mensagem(messagem, peer_socket, endereco):
+                        return
+
+            except Exception as e:
+                if peer_socket in self.peers:
+                    print(f"[{self.username}] Erro ao receber mensagem de {endereco}: {e.args[0]}")
+                    self.remove_peer(peer_socket)
+                    print("Conexão fechada")
+                break
+
+    def recebe_shm(self, consumer, peer_socket, endereco):
+        """
+        recebe as mensagens que o peer escreve no anel de memória compartilhada.
+
+        a conexão TCP continua aberta e é ela que detecta a queda do peer.
+
+        Args:
+            consumer (shm_transport.RingConsumer): consumidor do anel do peer.
+            peer_socket (socket.socket): socket do peer.
+            endereco (tuple): endereço (IP, porta) do peer conectado.
+        """
+        try:
+            while peer_socket in self.peers:
+                # bloqueia até o peer escrever no anel; remove_peer interrompe a espera
+                for data in consumer.read():
+                    # cada registro do anel é uma mensagem completa, sem o '\n' do TCP
+                    if not self.processa_mensagem(data.decode('utf-8').rstrip('\n'), peer_socket, endereco):
+                        return
+        except Exception as e:
+            if peer_socket in self.peers:
+                print(f"[{self.username}] Erro ao receber mensagem de {endereco} pela memória compartilhada: {e}")
+                self.remove_peer(peer_socket)
+        finally:
+            self.shm_readers.pop(peer_socket, None)
+            consumer.close()
+
+    def processa_mensagem(self, messagem, peer_socket, endereco):
+        """
+        processa uma mensagem completa recebida do peer, pelo TCP ou pela memória compartilhada.
 
-                    # ignora mensagens vazias
-                    if not messagem:
-                        continue
+        Args:
+            messagem (str): mensagem sem o '\n' final.
+            peer_socket (socket.socket): socket do peer.
+            endereco (tuple): endereço (IP, porta) do peer conectado.
 
-                    # processamento das mensagens
-                    parts = messagem.split(":")
+        Returns:
+            bool: false se o peer fechou a conexão.
 
-                    # se a mensagem tiver mal formada
-                    if len(parts) < 2:
-                        print(f"[{self.username}] Recebida mensagem corrompida: {messagem}")
-                        continue
+        tipos de mensagens esperadas:
+        - "<usuario>:msg:<texto>" → exibe mensagem de chat.
+        - "<usuario>:clear" → limpa o canvas.
+        - "<usuario>:shm|shmok|shmswitch:..." → negociação da memória compartilhada.
+        - outros → aplicam ações de desenho remoto.
+        """
+        # ignora mensagens vazias
+        if not messagem:
+            return True
 
-                    # remove os espaços em branco do início e do final
-                    part_1_stripped = parts[1].strip()
+        # processamento das mensagens
+        parts = messagem.split(":")
 
-                    if part_1_stripped == "msg":
-                        # permite ':' na mensagem
-                        chat_text = ":".join(parts[2:]).strip()
-                        print(f"Mensagem {parts[0] + ': ' + chat_text}")
+        # se a mensagem tiver mal formada
+        if len(parts) < 2:
+            print(f"[{self.username}] Recebida mensagem corrompida: {messagem}")
+            return True
 
-                    elif part_1_stripped == "clear":
-                        self.drawingTools.clear_canvas()
-                        print(f"[{parts[0]}] Apagou o Canvas")
+        # remove os espaços em branco do início e do final
+        part_1_stripped = parts[1].strip()
 
-                    elif part_1_stripped == "fechar":
-                        print(f"[{parts[0]}] Fechou a conexão")
-                        peer_socket.close()
-                        self.peers.remove(peer_socket)
-                        return
+        if part_1_stripped == "msg":
+            # permite ':' na mensagem
+            chat_text = ":".join(parts[2:]).strip()
+            print(f"Mensagem {parts[0] + ': ' + chat_text}")
 
-                    else:
-                        # envia uma única e completa mensagem para a aplicar o desenho da rede
-                        self.drawingTools.apply_remote_action(messagem)
+        elif part_1_stripped == "clear":
+            self.drawingTools.clear_canvas(parts[0])
+            print(f"[{parts[0]}] Apagou o Canvas")
 
-            except Exception as e:
-                print(f"[{self.username}] Erro ao receber mensagem de {endereco}: {e.args[0]}")
-                peer_socket.close()
+        elif part_1_stripped in ("image", "imgwant", "imgchunk"):
+            # importação de imagens (posição, pedido e pedaços do conteúdo)
+            self.drawingTools.images.handle_message(parts[0], part_1_stripped, parts[2:])
+
+        elif part_1_stripped in ("select", "transform"):
+            # seleção e movimento/escala em bloco de operações já desenhadas
+            self.drawingTools.selection.handle_message(parts[0], part_1_stripped, parts[2:])
+
+        elif part_1_stripped == "shm":
+            # o peer oferece o anel dele: só aceita se estiver na mesma máquina
+            if len(parts) >= 4 and parts[2] == shm_transport.host_id() and shm_transport.available():
+                try:
+                    self.shm_consumers[peer_socket] = shm_transport.ShmRing.attach(parts[3]).register()
+                    self.envia_para(peer_socket, "shmok")
+                except Exception as e:
+                    print(f"[{self.username}] Memória compartilhada indisponível, usando TCP: {e}")
+
+        elif part_1_stripped == "shmok":
+            # o peer já lê o anel: avisa pelo TCP que as próximas mensagens vão pelo anel
+            with self.send_lock:
+                peer_socket.sendall(f"{self.username}:shmswitch\n".encode('utf-8'))
+                self.shm_peers.add(peer_socket)
+            print(f"[{self.username}] Enviando para {endereco} por memória compartilhada")
+
+        elif part_1_stripped == "shmswitch":
+            # tudo que o peer mandou antes disso veio pelo TCP e já foi processado
+            consumer = self.shm_consumers.pop(peer_socket, None)
+            if consumer is not None:
+                self.shm_readers[peer_socket] = consumer
+                thread = threading.Thread(target=self.recebe_shm, args=(consumer, peer_socket, endereco))
+                thread.daemon = True
+                thread.start()
+
+        elif part_1_stripped == "fechar":
+            print(f"[{parts[0]}] Fechou a conexão")
+            self.remove_peer(peer_socket)
+            return False
+
+        else:
+            # envia uma única e completa mensagem para a aplicar o desenho da rede
+            self.drawingTools.apply_remote_action(messagem)
+        return True
+
+    def remove_peer(self, peer_socket):
+        """
+        fecha a conexão com o peer e descarta o seu estado de memória compartilhada.
+
+        Args:
+            peer_socket (socket.socket): socket do peer.
+        """
+        with self.send_lock:
+            if peer_socket in self.peers:
                 self.peers.remove(peer_socket)
-                print("Conexão fechada")
-                break
+            self.shm_peers.discard(peer_socket)
+        consumer = self.shm_consumers.pop(peer_socket, None)
+        if consumer is not None:
+            consumer.close()
+        consumer = self.shm_readers.get(peer_socket)
+        if consumer is not None:
+            # acorda a thread recebe_shm, que fecha o consumidor ao sair
+            consumer.interrupt()
+        try:
+            # acorda a thread que ainda estiver bloqueada no recv deste socket
+            peer_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        peer_socket.close()
+
+    def oferece_shm(self, peer_socket):
+        """
+        oferece ao peer recém-conectado o anel de memória compartilhada deste peer.
+
+        se o peer estiver na mesma máquina, ele responde "shmok" e as mensagens
+        passam a ir pelo anel; caso contrário a oferta é ignorada e tudo segue pelo TCP.
+
+        Args:
+            peer_socket (socket.socket): socket do peer.
+        """
+        if not shm_transport.available():
+            return
+        try:
+            if self.shm_ring is None:
+                self.shm_ring = shm_transport.ShmRing.create(f"paintpy_{os.getpid()}_{self.porta}")
+                atexit.register(self.shm_ring.close)
+            self.envia_para(peer_socket, f"shm:{shm_transport.host_id()}:{self.shm_ring.shm.name}")
+        except Exception as e:
+            print(f"[{self.username}] Não foi possível criar a memória compartilhada: {e}")
 
     def conecta(self, peer_ip, peer_porta):
         """
@@ -187,6 +323,7 @@ class Peer:
             thread = threading.Thread(target=self.recebe_mensagem, args=(client_socket, (peer_ip, peer_porta)))
             thread.daemon = True
             thread.start()
+            self.oferece_shm(client_socket)
             return True
         except Exception as e:
             print(f"[{self.username}] Não foi possível conectar a {peer_ip}:{peer_porta}. Erro: {e}")
@@ -199,11 +336,32 @@ class Peer:
             messagem (str): mensagem a ser enviada.
         """
         mensagem_formatada = f"{self.username}:{messagem}\n"
-        for peer_socket in self.peers:
-            try:
-                peer_socket.send(mensagem_formatada.encode('utf-8'))
-            except Exception as e:
-                print(f"[{self.username}] Falha ao enviar mensagem para um peer: {e}")
+        dados = mensagem_formatada.encode('utf-8')
+        with self.send_lock:
+            if self.shm_peers:
+                # uma única escrita no anel serve a todos os peers da mesma máquina
+                try:
+                    self.shm_ring.write(dados)
+                except Exception as e:
+                    print(f"[{self.username}] Falha ao enviar mensagem pela memória compartilhada: {e}")
+            for peer_socket in self.peers:
+                if peer_socket in self.shm_peers:
+                    continue
+                try:
+                    peer_socket.sendall(dados)
+                except Exception as e:
+                    print(f"[{self.username}] Falha ao enviar mensagem para um peer: {e}")
+
+    def envia_para(self, peer_socket, messagem):
+        """
+        envia uma mensagem apenas para um peer, sempre pelo TCP.
+
+        Args:
+            peer_socket (socket.socket): socket do peer.
+            messagem (str): mensagem a ser enviada.
+        """
+        with self.send_lock:
+            peer_socket.sendall(f"{self.username}:{messagem}\n".encode('utf-8'))
 
     def start(self):
         """
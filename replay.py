@@ -0,0 +1,500 @@
+import argparse
+import os
+import time
+import tkinter as tk
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont, ImageTk
+
+from document import CONTROL_TOOLS, NO_SEQ, TOOLS, Document
+from image_tool import ImagePyramid, ImageStore
+from selection_tool import decode_ranges
+
+# a cada quantas linhas do documento um keyframe é guardado
+KEYFRAME_EVERY = 2000
+# quantos keyframes rasterizados ficam descomprimidos em memória
+RASTER_CACHE = 8
+# nível do zlib usado nos pixels dos keyframes (rápido; o canvas é quase todo branco)
+RASTER_COMPRESSION = 1
+# intervalo entre quadros do player, em ms
+FRAME_MS = 33
+# velocidades oferecidas pelo player
+SPEEDS = (0.5, 1, 2, 4, 8, 16)
+
+
+class Scene:
+    """
+    estado compacto do canvas em um ponto da sessão (um keyframe).
+
+    as operações visíveis são todas as linhas de desenho em [start, stop);
+    só as coordenadas alteradas por 'move'/'scale' são guardadas à parte.
+    """
+    def __init__(self, start=0, stop=0, moved=None, selections=None):
+        # primeira linha depois do último 'clear'
+        self.start = start
+        # linhas já aplicadas
+        self.stop = stop
+        # linha -> (x1, y1, x2, y2) transformados
+        self.moved = moved or {}
+        # índice do usuário -> linhas da sua seleção atual
+        self.selections = selections or {}
+
+    def copy(self):
+        return Scene(self.start, self.stop, dict(self.moved),
+                     {user: list(rows) for user, rows in self.selections.items()})
+
+
+class Rasterizer:
+    """
+    desenha as operações do documento em uma imagem do Pillow, sem precisar do Tk.
+    """
+    def __init__(self, document, size, store=None):
+        """
+        Args:
+            document (Document): documento com as operações.
+            size (tuple): (largura, altura) da imagem.
+            store (ImageStore | None): cache de imagens importadas.
+        """
+        self.document = document
+        self.size = size
+        self.store = store or ImageStore()
+        self._fonts = {}
+        # uma pirâmide por imagem, decodificada uma única vez
+        self._pyramids = {}
+        # imagens já redimensionadas: (hash, largura, altura) -> imagem, em LRU
+        self._images = OrderedDict()
+
+    def blank(self):
+        return Image.new("RGB", self.size, "white")
+
+    def render(self, scene):
+        """
+        desenha uma cena inteira.
+        """
+        image = self.blank()
+        draw = ImageDraw.Draw(image)
+        for row in range(scene.start, scene.stop):
+            if TOOLS[self.document.tool[row]] not in CONTROL_TOOLS:
+                self.draw_row(image, draw, row, scene.moved.get(row))
+        return image
+
+    def draw_row(self, image, draw, row, coords=None):
+        """
+        desenha uma operação, do mesmo jeito que DrawingTools desenha no canvas.
+
+        Args:
+            coords (tuple | None): coordenadas transformadas, se houver.
+        """
+        document = self.document
+        tool = TOOLS[document.tool[row]]
+        color = document.colors[document.color[row]]
+        size = document.size[row]
+        x1, y1, x2, y2 = coords or (document.x1[row], document.y1[row], document.x2[row], document.y2[row])
+
+        if tool in ("pen", "line", "eraser"):
+            if tool == "eraser":
+                color, size = "white", size * 2
+            draw.line((x1, y1, x2, y2), fill=color, width=size)
+            # pontas arredondadas, como capstyle=ROUND
+            radius = size / 2
+            if radius > 1:
+                for x, y in ((x1, y1), (x2, y2)):
+                    draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+
+        elif tool == "rectangle":
+            draw.rectangle((x1, y1, x2, y2), outline=color, width=size)
+
+        elif tool == "circle":
+            draw.ellipse((x1, y1, x2, y2), outline=color, width=size)
+
+        elif tool == "text":
+            draw.text((x1, y1), document.extra.get(row, ""), fill=color, font=self._font(size))
+
+        elif tool == "image":
+            width, height = max(1, round(x2 - x1)), max(1, round(y2 - y1))
+            picture = self._image(document.extra.get(row), width, height)
+            if picture is None:
+                draw.rectangle((x1, y1, x2, y2), outline="grey", fill="#EEEEEE")
+            else:
+                mask = picture if picture.mode == "RGBA" else None
+                image.paste(picture, (round(x1), round(y1)), mask)
+
+    def _font(self, size):
+        font = self._fonts.get(size)
+        if font is None:
+            try:
+                font = ImageFont.truetype("arial.ttf", size)
+            except OSError:
+                font = ImageFont.load_default()
+            self._fonts[size] = font
+        return font
+
+    def _image(self, digest, width, height):
+        """
+        a imagem no tamanho exibido, ou None se ela ainda não estiver no cache em disco.
+
+        imagens escaladas geram um tamanho novo a cada quadro; cada um é
+        redimensionado a partir do menor nível suficiente da pirâmide, sem
+        decodificar o arquivo de novo.
+        """
+        key = (digest, width, height)
+        picture = self._images.get(key)
+        if picture is not None:
+            self._images.move_to_end(key)
+            return picture
+
+        pyramid = self._pyramids.get(digest)
+        if pyramid is None:
+            if not digest or not self.store.has(digest):
+                return None
+            pyramid = self._pyramids[digest] = ImagePyramid(self.store.path(digest))
+        picture = pyramid.render(width, height)
+        self._images[key] = picture
+        if len(self._images) > RASTER_CACHE:
+            self._images.popitem(last=False)
+        return picture
+
+
+class ReplayEngine:
+    """
+    reprodução de uma sessão gravada ou em andamento, com busca por keyframes.
+
+    a cada KEYFRAME_EVERY linhas é guardada uma cena compacta (Scene) e os seus
+    pixels comprimidos. Os keyframes são rasterizados uma única vez, em sequência,
+    cada um a partir do anterior mais as linhas entre eles. Buscar um instante
+    custa descomprimir o keyframe anterior e aplicar no máximo KEYFRAME_EVERY linhas.
+
+    quando um 'move'/'scale' obriga a redesenhar, o desenho recomeça do keyframe
+    mais recente que ainda não contém nenhuma das linhas transformadas.
+    """
+    def __init__(self, document, size=(800, 600), store=None):
+        """
+        Args:
+            document (Document): documento da sessão. As linhas adicionadas depois
+                da criação do engine não entram na reprodução.
+            size (tuple): (largura, altura) dos quadros.
+            store (ImageStore | None): cache de imagens importadas.
+        """
+        self.document = document
+        self.length = len(document)
+        self.rasterizer = Rasterizer(document, size, store)
+        # pixels de cada keyframe, comprimidos, e os últimos usados já descomprimidos
+        self._compressed = []
+        self._rasters = OrderedDict()
+
+        # (índice do usuário, seq) -> linha, para resolver as seleções
+        self._op_rows = {}
+        # linhas de 'move'/'scale' e a menor linha que cada uma alterou
+        self._transform_rows = []
+        self._transform_lows = []
+        self.keyframes = []
+        self._build_keyframes()
+
+        self.scene = Scene()
+        self.image = self.rasterizer.blank()
+        self._draw = ImageDraw.Draw(self.image)
+
+    @property
+    def duration(self):
+        return self.document.t[self.length - 1] if self.length else 0.0
+
+    def _build_keyframes(self):
+        """
+        percorre o documento uma vez, guardando as cenas e os pixels dos keyframes.
+        """
+        document = self.document
+        scene = Scene()
+        image = self.rasterizer.blank()
+        draw = ImageDraw.Draw(image)
+        # uma transformação desde o último keyframe: os pixels só são refeitos no próximo
+        dirty = False
+        for row in range(self.length):
+            if row % KEYFRAME_EVERY == 0:
+                if dirty:
+                    image = self._render(scene)
+                    draw = ImageDraw.Draw(image)
+                    dirty = False
+                self.keyframes.append(scene.copy())
+                self._compressed.append(zlib.compress(image.tobytes(), RASTER_COMPRESSION))
+            if document.seq[row] != NO_SEQ:
+                self._op_rows[(document.user[row], document.seq[row])] = row
+
+            change = self._apply(scene, row)
+            if change == "draw" and not dirty:
+                self.rasterizer.draw_row(image, draw, row, scene.moved.get(row))
+            elif change == "clear":
+                image = self.rasterizer.blank()
+                draw = ImageDraw.Draw(image)
+                dirty = False
+            elif change == "transform":
+                selection = scene.selections.get(document.user[row])
+                if selection:
+                    self._transform_rows.append(row)
+                    self._transform_lows.append(min(selection))
+                    dirty = True
+
+    def _apply(self, scene, row):
+        """
+        aplica uma linha na cena.
+
+        Returns:
+            str: 'draw' se a linha só adiciona um desenho, 'clear' ou 'transform'
+            se a imagem atual precisa ser refeita, ou '' se nada muda.
+        """
+        document = self.document
+        tool = TOOLS[document.tool[row]]
+        user = document.user[row]
+        scene.stop = row + 1
+
+        if tool == "clear":
+            scene.start = row + 1
+            scene.moved = {}
+            scene.selections = {}
+            return "clear"
+
+        if tool == "select":
+            ops = ((document.users.find(name), n) for name, n in decode_ranges(document.extra.get(row, "")))
+            rows = (self._op_rows.get(op) for op in ops)
+            scene.selections[user] = [r for r in rows if r is not None and scene.start <= r < row]
+            return ""
+
+        if tool in ("move", "scale"):
+            a, b, factor = document.x1[row], document.y1[row], document.x2[row]
+            for r in scene.selections.get(user, ()):
+                x1, y1, x2, y2 = scene.moved.get(r) or (document.x1[r], document.y1[r],
+                                                        document.x2[r], document.y2[r])
+                if tool == "move":
+                    scene.moved[r] = (x1 + a, y1 + b, x2 + a, y2 + b)
+                else:
+                    scene.moved[r] = (a + (x1 - a) * factor, b + (y1 - b) * factor,
+                                      a + (x2 - a) * factor, b + (y2 - b) * factor)
+            return "transform"
+
+        return "draw"
+
+    def row_at(self, t):
+        """
+        quantidade de linhas com instante <= t.
+        """
+        return min(self.length, bisect_right(self.document.t, t))
+
+    def seek(self, t):
+        """
+        posiciona a reprodução no instante t e retorna o quadro.
+
+        Args:
+            t (float): segundos desde o início da sessão.
+
+        Returns:
+            PIL.Image.Image: quadro do instante t.
+        """
+        row = self.row_at(t)
+        index = min(len(self.keyframes) - 1, row // KEYFRAME_EVERY) if self.keyframes else -1
+        if index < 0:
+            self.scene = Scene()
+            self.image = self.rasterizer.blank()
+        else:
+            self.scene = self.keyframes[index].copy()
+            self.image = self._raster(index).copy()
+        self._draw = ImageDraw.Draw(self.image)
+        return self.advance(row)
+
+    def advance(self, row):
+        """
+        aplica as linhas até `row` (exclusiva) a partir da posição atual.
+
+        Returns:
+            PIL.Image.Image: quadro atualizado.
+        """
+        redraw = False
+        for r in range(self.scene.stop, min(row, self.length)):
+            change = self._apply(self.scene, r)
+            if change == "draw" and not redraw:
+                self.rasterizer.draw_row(self.image, self._draw, r, self.scene.moved.get(r))
+            elif change in ("clear", "transform"):
+                # pixels já desenhados mudaram; a imagem é refeita uma vez no final
+                redraw = True
+        if redraw:
+            self.image = self._render(self.scene)
+            self._draw = ImageDraw.Draw(self.image)
+        return self.image
+
+    def advance_to(self, t):
+        """
+        avança a reprodução até o instante t (t deve ser >= ao instante atual).
+        """
+        return self.advance(self.row_at(t))
+
+    def _render(self, scene):
+        """
+        redesenha a cena a partir do keyframe mais recente cujos pixels continuam válidos.
+
+        um keyframe serve se não houve 'clear' depois dele e se nenhuma transformação
+        feita depois dele alterou linhas anteriores a ele. Sem um keyframe assim, a
+        cena é desenhada do zero (todas as linhas desde o último 'clear').
+        """
+        end = bisect_left(self._transform_rows, scene.stop)
+        cursor = end
+        lowest = scene.stop
+        index = min(len(self.keyframes), scene.stop // KEYFRAME_EVERY + 1) - 1
+        while index >= 0:
+            keyframe = self.keyframes[index]
+            if keyframe.start != scene.start:
+                break
+            begin = bisect_left(self._transform_rows, keyframe.stop, 0, cursor)
+            if begin < cursor:
+                lowest = min(lowest, min(self._transform_lows[begin:cursor]))
+                cursor = begin
+            if lowest >= keyframe.stop:
+                image = self._raster(index).copy()
+                draw = ImageDraw.Draw(image)
+                for row in range(keyframe.stop, scene.stop):
+                    if TOOLS[self.document.tool[row]] not in CONTROL_TOOLS:
+                        self.rasterizer.draw_row(image, draw, row, scene.moved.get(row))
+                return image
+            index -= 1
+        return self.rasterizer.render(scene)
+
+    def _raster(self, index):
+        raster = self._rasters.get(index)
+        if raster is None:
+            raster = Image.frombytes("RGB", self.rasterizer.size, zlib.decompress(self._compressed[index]))
+            self._rasters[index] = raster
+            if len(self._rasters) > RASTER_CACHE:
+                self._rasters.popitem(last=False)
+        else:
+            self._rasters.move_to_end(index)
+        return raster
+
+    def timelapse(self, output_dir, fps=30, speed=60):
+        """
+        gera os quadros de um time-lapse, sem Tk e mais rápido que o tempo real.
+
+        Args:
+            output_dir (str): pasta onde os PNGs são gravados.
+            fps (int): quadros por segundo do vídeo final.
+            speed (float): quantos segundos da sessão cada segundo do vídeo mostra.
+
+        Returns:
+            int: quantidade de quadros gravados.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        step = speed / fps
+        self.seek(0)
+        frame = 0
+        t = 0.0
+        while True:
+            image = self.advance_to(t)
+            image.save(os.path.join(output_dir, f"frame_{frame:06d}.png"))
+            frame += 1
+            if t >= self.duration:
+                return frame
+            t += step
+
+
+class ReplayWindow:
+    """
+    janela de reprodução com play/pause, busca e velocidade variável.
+    """
+    def __init__(self, root, engine):
+        """
+        Args:
+            root (tk.Tk): janela principal do Tkinter.
+            engine (ReplayEngine): engine com a sessão a reproduzir.
+        """
+        self.engine = engine
+        self.playing = False
+        self.position = 0.0
+        self._last_tick = None
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Replay")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        controls = tk.Frame(self.window, bd=2, relief=tk.RAISED)
+        controls.pack(side=tk.TOP, fill=tk.X)
+
+        self.play_button = tk.Button(controls, text="Play", width=6, command=self.toggle)
+        self.play_button.pack(side=tk.LEFT, padx=5, pady=5)
+
+        self.speed = tk.StringVar(value="1")
+        tk.Label(controls, text="Speed:").pack(side=tk.LEFT, padx=5, pady=5)
+        tk.OptionMenu(controls, self.speed, *(str(speed) for speed in SPEEDS)).pack(side=tk.LEFT, padx=5, pady=5)
+
+        # sem "command": o Tk chama o command também quando o player move o slider,
+        # e cada chamada viraria um seek completo. A busca só acontece com o mouse.
+        self.slider_value = tk.DoubleVar(value=0.0)
+        self.slider = tk.Scale(controls, from_=0, to=max(engine.duration, 0.1), resolution=0.1,
+                               orient=tk.HORIZONTAL, showvalue=True, variable=self.slider_value)
+        self.slider.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, pady=5)
+        self.slider.bind("<B1-Motion>", self._on_slider)
+        self.slider.bind("<ButtonRelease-1>", self._on_slider)
+
+        self.photo = ImageTk.PhotoImage(engine.seek(0))
+        self.label = tk.Label(self.window, image=self.photo, bd=0)
+        self.label.pack()
+
+        self._job = self.window.after(FRAME_MS, self._tick)
+
+    def toggle(self):
+        if self.playing:
+            self.playing = False
+        else:
+            if self.position >= self.engine.duration:
+                self._seek(0)
+            self.playing = True
+            self._last_tick = time.monotonic()
+        self.play_button.config(text="Pause" if self.playing else "Play")
+
+    def close(self):
+        self.window.after_cancel(self._job)
+        self.window.destroy()
+
+    def _on_slider(self, event):
+        # os binds do widget rodam antes dos da classe Scale, que atualizam o valor
+        self.window.after_idle(self._seek_to_slider)
+
+    def _seek_to_slider(self):
+        t = self.slider_value.get()
+        if t != self.position:
+            self._seek(t)
+
+    def _seek(self, t):
+        self.position = t
+        self.photo.paste(self.engine.seek(t))
+
+    def _tick(self):
+        if self.playing:
+            now = time.monotonic()
+            self.position += (now - self._last_tick) * float(self.speed.get())
+            self._last_tick = now
+            self.photo.paste(self.engine.advance_to(self.position))
+
+            self.slider_value.set(self.position)
+            if self.position >= self.engine.duration:
+                self.toggle()
+        self._job = self.window.after(FRAME_MS, self._tick)
+
+
+if __name__ == "__main__":
+    """
+    gera os quadros de um time-lapse a partir de uma sessão gravada.
+
+    ex: python replay.py sessao.paintpy quadros/ --speed 60 --fps 30
+    depois: ffmpeg -framerate 30 -i quadros/frame_%06d.png timelapse.mp4
+    """
+    parser = argparse.ArgumentParser(description="Gera um time-lapse de uma sessão gravada.")
+    parser.add_argument("session", help="arquivo gravado pelo botão Save")
+    parser.add_argument("output_dir", help="pasta onde os quadros serão gravados")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--speed", type=float, default=60, help="segundos da sessão por segundo de vídeo")
+    parser.add_argument("--size", default="800x600", help="tamanho dos quadros, ex: 800x600")
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.split("x"))
+    engine = ReplayEngine(Document.load(args.session), (width, height))
+    start = time.perf_counter()
+    frames = engine.timelapse(args.output_dir, args.fps, args.speed)
+    print(f"{frames} quadros em {time.perf_counter() - start:.1f} s ({engine.duration:.1f} s de sessão)")
@@ -0,0 +1,266 @@
+# tag que agrupa os itens selecionados localmente (e a moldura da seleção)
+SELECTED_TAG = "selected"
+# tag da moldura e da alça de escala, que não fazem parte do desenho
+SELECTION_UI_TAG = "selection_ui"
+# lado da alça de escala no canto inferior direito da seleção
+HANDLE_SIZE = 8
+# distância mínima usada no cálculo da escala, evita dividir por zero
+MIN_SCALE_DISTANCE = 5
+
+
+def encode_ranges(ops):
+    """
+    codifica identificadores de operações em intervalos compactos.
+
+    traços do pincel geram ids consecutivos, então milhares de segmentos
+    viram poucos intervalos.
+
+    Args:
+        ops (iterable[tuple[str, int]]): pares (usuário, número da operação).
+
+    Returns:
+        str: intervalos no formato "<usuario>.<inicio>-<fim>,<usuario>.<n>,...".
+    """
+    by_user = {}
+    for user, n in ops:
+        by_user.setdefault(user, []).append(n)
+
+    ranges = []
+    for user, numbers in by_user.items():
+        numbers.sort()
+        start = prev = numbers[0]
+        for n in numbers[1:] + [None]:
+            if n is not None and n == prev + 1:
+                prev = n
+                continue
+            ranges.append(f"{user}.{start}" if start == prev else f"{user}.{start}-{prev}")
+            if n is not None:
+                start = prev = n
+    return ",".join(ranges)
+
+
+def decode_ranges(text):
+    """
+    decodifica os intervalos gerados por encode_ranges.
+
+    Yields:
+        tuple[str, int]: pares (usuário, número da operação).
+    """
+    for item in text.split(","):
+        if not item:
+            continue
+        user, span = item.rsplit(".", 1)
+        start, _, end = span.partition("-")
+        for n in range(int(start), int(end or start) + 1):
+            yield user, n
+
+
+class SelectionTool:
+    """
+    ferramenta de seleção retangular com movimento e escala em bloco.
+
+    os itens selecionados recebem uma tag de grupo, então arrastar ou escalar
+    custa uma única chamada canvas.move/canvas.scale por quadro, e uma única
+    mensagem para o outro peer.
+
+    mensagens trocadas com o outro peer:
+        - select:<intervalos>                → define a seleção do usuário (ids das operações)
+        - transform:move:<dx>:<dy>           → move a seleção do usuário
+        - transform:scale:<ox>:<oy>:<fator>  → escala a seleção do usuário a partir de (ox, oy)
+    """
+    def __init__(self, drawing_tools):
+        """
+        Args:
+            drawing_tools (DrawingTools): dono do canvas e do registro de operações.
+        """
+        self.drawing_tools = drawing_tools
+        # None, "rubber" (desenhando o retângulo), "move" ou "scale"
+        self.mode = None
+        self.rubber_id = None
+        self.outline_id = None
+        self.handle_id = None
+        self.start_x, self.start_y = None, None
+        self.last_x, self.last_y = None, None
+        # origem e distância anterior usadas na escala
+        self.origin = None
+        self.last_distance = None
+
+    @property
+    def canvas(self):
+        return self.drawing_tools.canvas
+
+    def start(self, event):
+        """
+        inicia um retângulo de seleção, ou o movimento/escala da seleção atual.
+
+        Args:
+            event (tk.Event): evento de clique no canvas.
+        """
+        self.last_x, self.last_y = event.x, event.y
+
+        if self.handle_id and self._inside(self.handle_id, event.x, event.y, margin=HANDLE_SIZE):
+            x0, y0, x1, y1 = self.canvas.coords(self.outline_id)
+            self.mode = "scale"
+            self.origin = (x0, y0)
+            self.last_distance = max(MIN_SCALE_DISTANCE, (event.x - x0) + (event.y - y0))
+
+        elif self.outline_id and self._inside(self.outline_id, event.x, event.y):
+            self.mode = "move"
+
+        else:
+            self.clear()
+            self.mode = "rubber"
+            self.start_x, self.start_y = event.x, event.y
+            self.rubber_id = self.canvas.create_rectangle(event.x, event.y, event.x, event.y,
+                                                          outline="#3399FF", dash=(4, 2),
+                                                          tags=SELECTION_UI_TAG)
+
+    def drag(self, event):
+        """
+        atualiza o retângulo de seleção, ou move/escala a seleção.
+
+        Args:
+            event (tk.Event): evento de movimento do mouse.
+        """
+        if self.mode == "rubber":
+            self.canvas.coords(self.rubber_id, self.start_x, self.start_y, event.x, event.y)
+
+        elif self.mode == "move":
+            dx, dy = event.x - self.last_x, event.y - self.last_y
+            if dx or dy:
+                self.canvas.move(SELECTED_TAG, dx, dy)
+                self._record("move", dx, dy)
+                self._send(f"transform:move:{dx}:{dy}")
+
+        elif self.mode == "scale":
+            ox, oy = self.origin
+            distance = max(MIN_SCALE_DISTANCE, (event.x - ox) + (event.y - oy))
+            # arredondado como vai na mensagem, para os dois peers aplicarem o mesmo fator
+            factor = round(distance / self.last_distance, 6)
+            if factor != 1:
+                self.canvas.scale(SELECTED_TAG, ox, oy, factor, factor)
+                self._record("scale", ox, oy, factor)
+                self._send(f"transform:scale:{ox}:{oy}:{factor}")
+            self.last_distance = distance
+
+        self.last_x, self.last_y = event.x, event.y
+
+    def end(self, event):
+        """
+        finaliza a seleção ou a transformação.
+
+        Args:
+            event (tk.Event): evento de soltar o botão.
+        """
+        if self.mode == "rubber":
+            x0, y0, x1, y1 = self.canvas.coords(self.rubber_id)
+            self.canvas.delete(self.rubber_id)
+            self.rubber_id = None
+            self._select(self.canvas.find_overlapping(x0, y0, x1, y1))
+
+        elif self.mode in ("move", "scale"):
+            # redesenha a moldura (a alça também foi escalada) e os tiles de imagens
+            self._draw_outline()
+            self.drawing_tools.images.request_refresh()
+
+        self.mode = None
+
+    def clear(self):
+        """
+        desfaz a seleção local.
+        """
+        self.canvas.delete(SELECTION_UI_TAG)
+        self.canvas.dtag(SELECTED_TAG)
+        self.rubber_id = self.outline_id = self.handle_id = None
+        self.mode = None
+
+    def handle_message(self, user, kind, parts):
+        """
+        aplica a seleção ou transformação recebida do outro peer.
+
+        Args:
+            user (str): usuário que enviou a mensagem.
+            kind (str): tipo da mensagem ('select' ou 'transform').
+            parts (list[str]): campos da mensagem após o tipo.
+        """
+        try:
+            self._apply(user, kind, parts)
+        except Exception as e:
+            print(f"Erro ao aplicar seleção remota: {e}. Mensagem: '{kind}:{':'.join(parts)}'")
+
+    def _apply(self, user, kind, parts):
+        tag = f"sel_{user}"
+        document = self.drawing_tools.document
+        if kind == "select":
+            ranges = parts[0].strip()
+            document.append(user, "select", extra=ranges)
+            self.canvas.dtag(tag)
+            for op in decode_ranges(ranges):
+                target = self.drawing_tools.item_of_op(op)
+                if target is not None:
+                    self.canvas.addtag_withtag(tag, target)
+
+        elif kind == "transform":
+            action = parts[0].strip()
+            values = [float(value) for value in parts[1:4]]
+            if action == "move":
+                self.canvas.move(tag, *values[:2])
+            elif action == "scale":
+                self.canvas.scale(tag, *values[:2], values[2], values[2])
+            document.append(user, action, "", 0, *values)
+            self.drawing_tools.images.request_refresh()
+
+    def _select(self, items):
+        """
+        seleciona as operações dos itens encontrados e avisa o outro peer.
+        """
+        ops = set()
+        for item in items:
+            op = self.drawing_tools.op_of_item(item)
+            if op is not None:
+                ops.add(op)
+        if not ops:
+            return
+
+        for op in ops:
+            self.canvas.addtag_withtag(SELECTED_TAG, self.drawing_tools.item_of_op(op))
+        self._draw_outline()
+        ranges = encode_ranges(ops)
+        self.drawing_tools.document.append(self.drawing_tools.username, "select", extra=ranges)
+        self._send(f"select:{ranges}")
+
+    def _draw_outline(self):
+        """
+        desenha a moldura da seleção e a alça de escala.
+
+        elas também recebem a tag de seleção, então acompanham o movimento
+        na mesma chamada canvas.move.
+        """
+        self.canvas.delete(SELECTION_UI_TAG)
+        self.outline_id = self.handle_id = None
+        bbox = self.canvas.bbox(SELECTED_TAG)
+        if not bbox:
+            return
+        x0, y0, x1, y1 = bbox
+        tags = (SELECTED_TAG, SELECTION_UI_TAG)
+        self.outline_id = self.canvas.create_rectangle(x0, y0, x1, y1, outline="#3399FF",
+                                                       dash=(4, 2), tags=tags)
+        self.handle_id = self.canvas.create_rectangle(x1 - HANDLE_SIZE, y1 - HANDLE_SIZE, x1, y1,
+                                                      outline="#3399FF", fill="white", tags=tags)
+
+    def _record(self, action, *values):
+        """
+        registra a transformação local no documento.
+        """
+        self.drawing_tools.document.append(self.drawing_tools.username, action, "", 0, *values)
+
+    def _inside(self, item, x, y, margin=0):
+        coords = self.canvas.coords(item)
+        if not coords:
+            return False
+        x0, y0, x1, y1 = coords
+        return x0 - margin <= x <= x1 + margin and y0 - margin <= y <= y1 + margin
+
+    def _send(self, msg):
+        if self.drawing_tools.peer:
+            self.drawing_tools.peer.envia_mensagem(msg)
@@ -0,0 +1,528 @@
+import os
+import select
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import shared_memory
+
+# variável de ambiente que desliga o transporte por memória compartilhada (PAINTPY_SHM=0)
+ENV_VAR = "PAINTPY_SHM"
+# identifica o formato do cabeçalho do anel
+MAGIC = 0x50505953  # "PPYS"
+# tamanho da área de dados do anel (mensagens maiores que isso não cabem)
+RING_CAPACITY = 4 * 1024 * 1024
+# quantidade máxima de consumidores (peers na mesma máquina) por anel
+MAX_CONSUMERS = 8
+# intervalo máximo em que um consumidor bloqueado confere o anel sem ser acordado
+# (proteção contra uma campainha perdida; normalmente ele é acordado antes)
+WAKE_CHECK = 1.0
+# tempo máximo que o produtor espera um consumidor parado antes de descartá-lo
+WRITE_TIMEOUT = 5.0
+
+# o cabeçalho é um vetor de inteiros de 8 bytes, acessado por memoryview.cast("Q"):
+# cada leitura/escrita é uma única operação de 8 bytes, então o outro processo nunca
+# vê uma posição pela metade (struct.pack_into zera o destino antes de escrever)
+_MAGIC, _CAPACITY, _WRITE_POS, _TICKETS = 0, 1, 2, 3
+# um byte por consumidor: cada um escreve só o seu byte e o produtor
+# confere todos com uma única leitura da palavra
+_PARKED = 4
+_SLOTS = 5
+# palavras de cada consumidor, a partir do início da sua vaga
+_READ_POS, _ACTIVE, _TICKET = 0, 1, 2
+_SLOT_WORDS = 3
+_DATA_OFFSET = (_SLOTS + _SLOT_WORDS * MAX_CONSUMERS) * 8
+_LENGTH = struct.Struct("<I")
+
+
+def host_id():
+    """
+    identifica a máquina (e o boot atual), para os peers saberem se podem usar memória compartilhada.
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            boot = f.read().strip()
+    except OSError:
+        boot = ""
+    return f"{socket.gethostname()}-{boot}".replace(":", "")
+
+
+def available():
+    """
+    diz se o anel pode ser usado no lugar do TCP com peers da mesma máquina.
+
+    a campainha dos consumidores é um FIFO (os.mkfifo), que não existe no Windows.
+    """
+    return hasattr(os, "mkfifo") and os.environ.get(ENV_VAR, "") != "0"
+
+
+def _bell_path(ring_name, ticket):
+    """
+    caminho do FIFO usado como campainha de um consumidor.
+    """
+    return os.path.join(tempfile.gettempdir(), f"{ring_name}.{ticket}.bell")
+
+
+class ShmRing:
+    """
+    anel em memória compartilhada com um produtor e vários consumidores.
+
+    o cabeçalho guarda a posição de escrita e, para cada consumidor, a posição
+    de leitura, se está ativo, se está bloqueado esperando e o número do seu
+    registro; as posições só crescem e o deslocamento no anel é posição % capacidade.
+    cada mensagem é gravada como <tamanho (u32)><bytes>, podendo dar a volta no anel.
+
+    o produtor só sobrescreve dados que todos os consumidores ativos já leram,
+    então, como no TCP, nenhuma mensagem se perde e a ordem é mantida.
+
+    um consumidor sem mensagens marca que está bloqueado e espera no seu FIFO;
+    o produtor escreve um byte no FIFO só desses consumidores. Com mensagens
+    chegando seguido ninguém bloqueia e nenhuma chamada de sistema é feita.
+    """
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.buf = shm.buf
+        self.words = shm.buf[:_DATA_OFFSET].cast("Q")
+        self.owner = owner
+        if self.words[_MAGIC] != MAGIC:
+            raise ValueError(f"memória compartilhada {shm.name} não é um anel do PaintPy")
+        self.capacity = self.words[_CAPACITY]
+        # menor posição de leitura vista pelo produtor; só é relida quando o anel parece cheio
+        self._oldest = 0
+        # vaga de cada consumidor -> (número do registro, fd de escrita no FIFO)
+        self._bells = {}
+
+    @classmethod
+    def create(cls, name, capacity=RING_CAPACITY):
+        """
+        cria o anel (lado produtor).
+
+        Args:
+            name (str): nome do bloco de memória compartilhada.
+            capacity (int): tamanho da área de dados em bytes.
+        """
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_DATA_OFFSET + capacity)
+        words = shm.buf[:_DATA_OFFSET].cast("Q")
+        for index in range(len(words)):
+            words[index] = 0
+        words[_CAPACITY] = capacity
+        words[_MAGIC] = MAGIC
+        words.release()
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        abre um anel criado por outro processo (lado consumidor).
+
+        Args:
+            name (str): nome do bloco de memória compartilhada.
+        """
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            # o resource_tracker apagaria o bloco do produtor quando este processo terminasse
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    def close(self):
+        """
+        fecha o anel; o produtor também o remove do sistema.
+        """
+        for _, fd in self._bells.values():
+            os.close(fd)
+        self._bells = {}
+        self.words.release()
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def register(self):
+        """
+        registra um novo consumidor, que passa a receber as mensagens escritas a partir de agora.
+
+        Returns:
+            RingConsumer: consumidor registrado.
+        """
+        words = self.words
+        for slot in range(MAX_CONSUMERS):
+            index = _SLOTS + _SLOT_WORDS * slot
+            if not words[index + _ACTIVE]:
+                ticket = words[_TICKETS] + 1
+                words[_TICKETS] = ticket
+                words[index + _TICKET] = ticket
+                self.buf[_PARKED * 8 + slot] = 0
+                words[index + _READ_POS] = words[_WRITE_POS]
+                # o FIFO existe antes de o produtor ver a vaga ativa
+                consumer = RingConsumer(self, slot, ticket)
+                words[index + _ACTIVE] = 1
+                return consumer
+        raise RuntimeError("anel de memória compartilhada sem vagas para consumidores")
+
+    def write(self, data):
+        """
+        escreve uma mensagem no anel, esperando se algum consumidor estiver atrasado.
+
+        Args:
+            data (bytes): mensagem.
+        """
+        size = _LENGTH.size + len(data)
+        if size > self.capacity:
+            raise ValueError(f"mensagem de {len(data)} bytes não cabe no anel")
+
+        words = self.words
+        position = words[_WRITE_POS]
+        if position + size - self._oldest > self.capacity:
+            waited = time.monotonic()
+            while position + size - self._oldest_read(position) > self.capacity:
+                if time.monotonic() - waited > WRITE_TIMEOUT:
+                    self._drop_slowest()
+                    waited = time.monotonic()
+                time.sleep(0.0005)
+
+        offset = position % self.capacity
+        if offset + size <= self.capacity:
+            # caso comum: a mensagem não dá a volta no anel
+            start = _DATA_OFFSET + offset
+            _LENGTH.pack_into(self.buf, start, len(data))
+            self.buf[start + _LENGTH.size:start + size] = data
+        else:
+            self._copy_in(position, _LENGTH.pack(len(data)) + data)
+        # a posição de escrita só avança depois dos dados estarem no anel
+        words[_WRITE_POS] = position + size
+
+        # acorda quem está bloqueado esperando (as flags são conferidas depois de publicar a posição)
+        if words[_PARKED]:
+            for slot in range(MAX_CONSUMERS):
+                if self.buf[_PARKED * 8 + slot]:
+                    self.buf[_PARKED * 8 + slot] = 0
+                    self._ring(slot)
+
+    def _ring(self, slot):
+        """
+        toca a campainha (escreve um byte no FIFO) do consumidor da vaga `slot`.
+        """
+        index = _SLOTS + _SLOT_WORDS * slot
+        ticket = self.words[index + _TICKET]
+        bell = self._bells.get(slot)
+        if bell is None or bell[0] != ticket:
+            # vaga nova ou reutilizada por outro consumidor: abre o FIFO dele
+            if bell is not None:
+                os.close(bell[1])
+                del self._bells[slot]
+            try:
+                fd = os.open(_bell_path(self.shm.name, ticket), os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                # o consumidor já foi embora
+                return
+            bell = self._bells[slot] = (ticket, fd)
+        try:
+            os.write(bell[1], b"\0")
+        except BlockingIOError:
+            # FIFO cheio: o consumidor já tem campainhas para ler
+            pass
+        except OSError:
+            pass
+
+    def _oldest_read(self, position):
+        oldest = position
+        for slot in range(MAX_CONSUMERS):
+            index = _SLOTS + _SLOT_WORDS * slot
+            if self.words[index + _ACTIVE]:
+                oldest = min(oldest, self.words[index + _READ_POS])
+        self._oldest = oldest
+        return oldest
+
+    def _drop_slowest(self):
+        """
+        desativa o consumidor mais atrasado (provavelmente um processo que morreu).
+        """
+        active = [slot for slot in range(MAX_CONSUMERS)
+                  if self.words[_SLOTS + _SLOT_WORDS * slot + _ACTIVE]]
+        if active:
+            slot = min(active, key=lambda slot: self.words[_SLOTS + _SLOT_WORDS * slot + _READ_POS])
+            self.words[_SLOTS + _SLOT_WORDS * slot + _ACTIVE] = 0
+            # se ele estiver bloqueado, acorda para perceber que foi descartado
+            self._ring(slot)
+
+    def _copy_in(self, position, data):
+        offset = position % self.capacity
+        first = min(len(data), self.capacity - offset)
+        start = _DATA_OFFSET + offset
+        self.buf[start:start + first] = data[:first]
+        if first < len(data):
+            self.buf[_DATA_OFFSET:_DATA_OFFSET + len(data) - first] = data[first:]
+
+    def _copy_out(self, position, size):
+        offset = position % self.capacity
+        first = min(size, self.capacity - offset)
+        start = _DATA_OFFSET + offset
+        data = bytes(self.buf[start:start + first])
+        if first < size:
+            data += bytes(self.buf[_DATA_OFFSET:_DATA_OFFSET + size - first])
+        return data
+
+
+class RingConsumer:
+    """
+    um consumidor de um ShmRing, com sua própria posição de leitura e campainha (FIFO).
+    """
+    def __init__(self, ring, slot, ticket):
+        self.ring = ring
+        self.slot = slot
+        # início da vaga deste consumidor no cabeçalho
+        self.index = _SLOTS + _SLOT_WORDS * slot
+        self.path = _bell_path(ring.shm.name, ticket)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        os.mkfifo(self.path, 0o600)
+        self._bell = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        # este processo também mantém o FIFO aberto para escrita: sem nenhum escritor
+        # (ex: o produtor terminou) o poll veria o FIFO sempre pronto (EOF).
+        # também é por ele que interrupt() acorda o consumidor
+        self._keepalive = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        self._poll = select.poll()
+        self._poll.register(self._bell, select.POLLIN)
+        self._interrupted = False
+        # interrupt() pode ser chamado de outra thread enquanto close() fecha os fds
+        self._lock = threading.Lock()
+
+    def read(self, timeout=None):
+        """
+        espera e lê todas as mensagens disponíveis.
+
+        sem mensagens, marca a vaga como bloqueada e espera a campainha do
+        produtor, sem polling.
+
+        Args:
+            timeout (float | None): tempo máximo de espera em segundos.
+
+        Returns:
+            list[bytes]: as mensagens, na ordem; vazia se o tempo acabou ou se
+            interrupt() foi chamado.
+        """
+        buf = self.ring.buf
+        parked = _PARKED * 8 + self.slot
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            messages = self.read_nowait()
+            if messages or self._interrupted:
+                return messages
+
+            # marca antes de conferir de novo: uma mensagem escrita depois
+            # desta conferência vê a flag e toca a campainha
+            buf[parked] = 1
+            messages = self.read_nowait()
+            if messages:
+                buf[parked] = 0
+                return messages
+
+            wait = WAKE_CHECK if deadline is None else min(WAKE_CHECK, deadline - time.monotonic())
+            if wait <= 0:
+                buf[parked] = 0
+                return []
+            self._poll.poll(wait * 1000)
+            buf[parked] = 0
+            try:
+                os.read(self._bell, 4096)
+            except BlockingIOError:
+                pass
+
+    def read_nowait(self):
+        """
+        lê todas as mensagens disponíveis sem esperar.
+
+        os bytes pendentes são copiados de uma vez e a posição de leitura é
+        atualizada uma única vez, liberando o espaço para o produtor.
+
+        Returns:
+            list[bytes]: as mensagens, na ordem (vazia se não houver).
+        """
+        words = self.ring.words
+        if not words[self.index + _ACTIVE]:
+            raise ConnectionError("consumidor descartado pelo produtor")
+        read_pos = words[self.index + _READ_POS]
+        write_pos = words[_WRITE_POS]
+        if read_pos == write_pos:
+            return []
+
+        pending = self.ring._copy_out(read_pos, write_pos - read_pos)
+        messages = []
+        offset = 0
+        while offset < len(pending):
+            size = _LENGTH.unpack_from(pending, offset)[0]
+            offset += _LENGTH.size
+            messages.append(pending[offset:offset + size])
+            offset += size
+        words[self.index + _READ_POS] = write_pos
+        return messages
+
+    def interrupt(self):
+        """
+        faz um read() bloqueado (ou o próximo) retornar sem mensagens.
+
+        pode ser chamado de outra thread, ex: quando o peer desconecta.
+        """
+        with self._lock:
+            self._interrupted = True
+            if self._keepalive is not None:
+                try:
+                    os.write(self._keepalive, b"\0")
+                except BlockingIOError:
+                    pass
+
+    def close(self):
+        """
+        libera a vaga do consumidor, remove a campainha e fecha o anel.
+        """
+        with self._lock:
+            if self.ring.buf is None:
+                return
+            self.ring.words[self.index + _ACTIVE] = 0
+            os.close(self._bell)
+            os.close(self._keepalive)
+            self._keepalive = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.ring.close()
+
+
+def _tcp_echo(port):
+    """
+    processo de eco do benchmark via TCP, com o mesmo framing por '\\n' do Peer.
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", port))
+    server.listen()
+    conn, _ = server.accept()
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    buffer = b""
+    while True:
+        data = conn.recv(65536)
+        if not data:
+            break
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line in (b"ping", b"sync"):
+                conn.sendall(line + b"\n")
+    conn.close()
+    server.close()
+
+
+def _shm_echo(request_name, reply_name):
+    """
+    processo de eco do benchmark via memória compartilhada.
+    """
+    requests = ShmRing.attach(request_name).register()
+    replies = ShmRing.attach(reply_name)
+    replies.write(b"ready")
+    while True:
+        for message in requests.read():
+            if message in (b"ping", b"sync"):
+                replies.write(message)
+            elif message == b"quit":
+                requests.close()
+                replies.close()
+                return
+
+
+def benchmark(count=200_000, pings=2_000, idle_pings=50, idle_seconds=0.05):
+    """
+    compara o anel em memória compartilhada com TCP via loopback.
+
+    o outro lado é um processo independente (como outro peer), que ecoa 'sync' e 'ping'.
+
+    - vazão: envia `count` mensagens de desenho típicas e espera o outro lado confirmar;
+    - latência: ida e volta de uma mensagem curta, `pings` vezes seguidas;
+    - latência após pausa: `idle_pings` idas e voltas, cada uma depois de
+      `idle_seconds` sem mensagens (o caso comum: o usuário para e volta a desenhar).
+    """
+    message = b"alice:pen:0:#000000:2:120:340:121:342"
+
+    def median(values):
+        return sorted(values)[len(values) // 2] * 1e6
+
+    def report(name, elapsed, latencies, idle_latencies):
+        latencies.sort()
+        print(f"{name:>4}: {count / elapsed:>10,.0f} msg/s   latência ida e volta: "
+              f"mediana {median(latencies):.0f} µs, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f} µs, "
+              f"após pausa mediana {median(idle_latencies):.0f} µs")
+
+    def ping(send, receive, times, pause=0.0):
+        latencies = []
+        for _ in range(times):
+            time.sleep(pause)
+            start = time.perf_counter()
+            send()
+            receive()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    # --- TCP loopback ---
+    port = 47000 + os.getpid() % 1000
+    echo = subprocess.Popen([sys.executable, __file__, "--echo-tcp", str(port)])
+    for _ in range(100):
+        try:
+            client = socket.create_connection(("127.0.0.1", port))
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    reader = client.makefile("rb")
+
+    start = time.perf_counter()
+    for _ in range(count):
+        client.sendall(message + b"\n")
+    client.sendall(b"sync\n")
+    reader.readline()
+    elapsed = time.perf_counter() - start
+
+    latencies = ping(lambda: client.sendall(b"ping\n"), reader.readline, pings)
+    idle_latencies = ping(lambda: client.sendall(b"ping\n"), reader.readline, idle_pings, idle_seconds)
+    reader.close()
+    client.close()
+    echo.wait()
+    report("tcp", elapsed, latencies, idle_latencies)
+
+    # --- memória compartilhada ---
+    prefix = f"paintpy_bench_{os.getpid()}"
+    requests = ShmRing.create(prefix + "_req")
+    replies = ShmRing.create(prefix + "_rep").register()
+    echo = subprocess.Popen([sys.executable, __file__, "--echo-shm", prefix + "_req", prefix + "_rep"])
+    replies.read(timeout=10)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        requests.write(message)
+    requests.write(b"sync")
+    replies.read()
+    elapsed = time.perf_counter() - start
+
+    latencies = ping(lambda: requests.write(b"ping"), replies.read, pings)
+    idle_latencies = ping(lambda: requests.write(b"ping"), replies.read, idle_pings, idle_seconds)
+    requests.write(b"quit")
+    echo.wait()
+    requests.close()
+    replies.close()
+    report("shm", elapsed, latencies, idle_latencies)
+
+
+if __name__ == "__main__":
+    """
+    benchmark: python shm_transport.py
+    """
+    if sys.argv[1:2] == ["--echo-tcp"]:
+        _tcp_echo(int(sys.argv[2]))
+    elif sys.argv[1:2] == ["--echo-shm"]:
+        _shm_echo(sys.argv[2], sys.argv[3])
+    else:
+        benchmark()
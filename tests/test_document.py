@@ -0,0 +1,136 @@
+import pytest
+
+from document import COLUMNS, NO_SEQ, Document
+from selection_tool import encode_ranges
+
+
+def coords(document, row):
+    return document.row(row)[5:9]
+
+
+def test_append_and_row():
+    document = Document()
+    document.append("alice", "pen", "#000000", 2, 0, 0, 10, 10, seq=0, t=1.5)
+    document.append("bob", "text", "#FF0000", 12, 5, 5, extra="oi", seq=0, t=2.0)
+
+    assert len(document) == 2
+    assert document.row(0) == ("pen", "alice", 0, "#000000", 2, 0, 0, 10, 10, None, 1.5)
+    assert document.row(1) == ("text", "bob", 0, "#FF0000", 12, 5, 5, 0, 0, "oi", 2.0)
+
+
+def test_consecutive_segments_form_one_stroke():
+    document = Document()
+    document.append("alice", "pen", "#000000", 2, 0, 0, 1, 1, seq=0)
+    document.append("bob", "pen", "#000000", 2, 50, 50, 51, 51, seq=0)
+    document.append("alice", "pen", "#000000", 2, 1, 1, 2, 2, seq=1)
+    document.append("alice", "pen", "#000000", 2, 9, 9, 10, 10, seq=2)
+
+    assert [(stroke.start, stroke.stop, stroke.count) for stroke in document.strokes] == [(0, 3, 2), (1, 2, 1), (3, 4, 1)]
+    assert [row[2] for row in document.stroke_rows(document.strokes[0])] == [0, 1]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"tool": "fill"},
+    {"size": -1},
+    {"size": 70000},
+    {"seq": -1},
+])
+def test_invalid_append_leaves_columns_aligned(kwargs):
+    document = Document()
+    values = {"user": "alice", "tool": "pen", "color": "#000000", "size": 2, "seq": 0}
+    values.update(kwargs)
+    with pytest.raises(ValueError):
+        document.append(values.pop("user"), values.pop("tool"), **values)
+
+    document.append("alice", "pen", "#000000", 3, 1, 2, 3, 4, seq=7)
+    assert {len(getattr(document, name)) for name in COLUMNS} == {1}
+    assert document.row(0)[:9] == ("pen", "alice", 7, "#000000", 3, 1, 2, 3, 4)
+
+
+def test_compact_drops_everything_before_clear_and_control_rows():
+    document = Document()
+    document.append("alice", "pen", "#000000", 2, 0, 0, 1, 1, seq=0)
+    document.append("alice", "clear")
+    document.append("alice", "line", "#000000", 2, 0, 0, 5, 5, seq=1)
+
+    assert document.compact() == 2
+    assert len(document) == 1
+    assert document.row(0)[:3] == ("line", "alice", 1)
+
+
+def test_compact_applies_transforms_to_selection():
+    document = Document()
+    document.append("alice", "pen", "#000000", 2, 0, 0, 10, 10, seq=0)
+    document.append("alice", "pen", "#000000", 2, 10, 10, 20, 20, seq=1)
+    document.append("alice", "select", extra=encode_ranges([("alice", 0)]))
+    document.append("alice", "move", "", 0, 5, 5)
+    document.append("alice", "scale", "", 0, 5, 5, 2)
+    document.compact()
+
+    assert coords(document, 0) == (5, 5, 25, 25)
+    assert coords(document, 1) == (10, 10, 20, 20)
+
+
+def test_selection_survives_compact():
+    document = Document()
+    document.append("alice", "pen", "#000000", 2, 0, 0, 10, 10, seq=0)
+    document.append("alice", "select", extra=encode_ranges([("alice", 0)]))
+    document.append("alice", "move", "", 0, 5, 5)
+    document.compact()
+    document.append("alice", "move", "", 0, 5, 5)
+    document.compact()
+
+    assert coords(document, 0) == (10, 10, 20, 20)
+    select = document.row(len(document) - 1)
+    assert select[0] == "select" and select[2] == NO_SEQ and select[9] == "alice.0"
+    assert list(document.t) == sorted(document.t)
+
+
+def test_save_and_load(tmp_path):
+    document = Document()
+    document.append("alice", "pen", "#000000", 2, 0, 0, 1, 1, seq=0, t=0.5)
+    document.append("alice", "pen", "#000000", 2, 1, 1, 2, 2, seq=1, t=0.6)
+    document.append("bob", "text", "#FF0000", 12, 5, 5, extra="a:b", seq=0, t=0.7)
+    document.append("bob", "select", extra="alice.0-1", t=0.8)
+    path = tmp_path / "sessao.paintpy"
+    document.save(str(path))
+
+    loaded = Document.load(str(path))
+    assert [loaded.row(row) for row in range(len(loaded))] == [document.row(row) for row in range(len(document))]
+    assert [(stroke.start, stroke.stop) for stroke in loaded.strokes] == [(0, 2)]
+    # o documento lido continua aceitando operações
+    loaded.append("carol", "pen", "#00FF00", 1, 0, 0, 1, 1, seq=0)
+    assert loaded.row(4)[1] == "carol"
+
+
+def test_find_op_rows():
+    document = Document()
+    document.append("alice", "pen", "#000000", 2, 0, 0, 1, 1, seq=0)
+    document.append("bob", "pen", "#000000", 2, 0, 0, 1, 1, seq=5)
+    document.append("alice", "select", extra="alice.0")
+    document.append("alice", "line", "#000000", 2, 0, 0, 1, 1, seq=1)
+    # número muito à frente (vindo da rede) não vira um array gigante
+    document.append("bob", "pen", "#000000", 2, 0, 0, 1, 1, seq=4_000_000_000)
+
+    assert document.find("alice", 0) == 0
+    assert document.find("alice", 1) == 3
+    assert document.find("bob", 5) == 1
+    assert document.find("bob", 4_000_000_000) == 4
+    assert document.find("bob", 0) is None
+    assert document.find("bob", -1) is None
+    assert document.find("carol", 0) is None
+    assert max(len(rows) for rows in document._op_rows) < 10
+
+
+def test_find_after_compact_and_load(tmp_path):
+    document = Document()
+    document.append("alice", "pen", "#000000", 2, 0, 0, 1, 1, seq=0)
+    document.append("alice", "clear")
+    document.append("alice", "pen", "#000000", 2, 0, 0, 1, 1, seq=1)
+    path = tmp_path / "sessao.paintpy"
+    document.save(str(path))
+    assert Document.load(str(path)).find("alice", 1) == 2
+
+    document.compact()
+    assert document.find("alice", 0) is None
+    assert document.find("alice", 1) == 0
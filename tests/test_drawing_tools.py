@@ -0,0 +1,69 @@
+import itertools
+
+import pytest
+
+pytest.importorskip("PIL")
+pytest.importorskip("tkinter")
+
+from drawing_tools import DrawingTools
+
+
+class FakeCanvas:
+    """
+    só o que DrawingTools usa para registrar e resolver operações.
+    """
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.tags = {}
+
+    def create_line(self, *args, **kwargs):
+        return next(self._ids)
+
+    create_rectangle = create_oval = create_text = create_line
+
+    def gettags(self, item):
+        return self.tags.get(item, ())
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class FakePeer:
+    username = "alice"
+
+    def envia_mensagem(self, msg):
+        pass
+
+
+@pytest.fixture
+def tools():
+    return DrawingTools(FakeCanvas(), FakePeer())
+
+
+def test_local_and_remote_ops_resolve_both_ways(tools):
+    item = tools.canvas.create_line()
+    assert tools.register_op(None, item, "pen", "#000000", 2, (0, 0, 1, 1)) == 0
+    tools.apply_remote_action("bob:line:7:#FF0000:3:0:0:10:10")
+
+    assert tools.op_of_item(item) == ("alice", 0)
+    remote = tools.item_of_op(("bob", 7))
+    assert tools.op_of_item(remote) == ("bob", 7)
+    assert tools.item_of_op(("bob", 6)) is None
+
+
+def test_image_ops_resolve_through_their_tag(tools):
+    tools.register_op("bob", "image_0", "image", "", 0, (0, 0, 10, 10), "a" * 64, 3)
+    tile = tools.canvas.create_line()
+    tools.canvas.tags[tile] = ("drawn_item", "image_0")
+
+    assert tools.item_of_op(("bob", 3)) == "image_0"
+    assert tools.op_of_item(tile) == ("bob", 3)
+
+
+def test_clear_forgets_previous_ops(tools):
+    item = tools.canvas.create_line()
+    tools.register_op(None, item, "pen", "#000000", 2, (0, 0, 1, 1))
+    tools.clear_canvas()
+
+    assert tools.op_of_item(item) is None
+    assert tools.item_of_op(("alice", 0)) is None
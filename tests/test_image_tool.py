@@ -0,0 +1,112 @@
+import base64
+import hashlib
+import os
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from image_tool import CHUNK_SIZE, MAX_CHUNKS, MAX_PENDING_IMAGES, ImageManager, ImageStore, TileCache
+
+
+class FakePhoto:
+    # 10x10 RGBA => 400 bytes no cache
+    def width(self):
+        return 10
+
+    def height(self):
+        return 10
+
+
+def test_tile_shared_by_two_layers_stays_pinned_until_both_release_it():
+    cache = TileCache(limit_bytes=400)
+    cache.put("shared", FakePhoto())
+    cache.pin("shared")
+    cache.pin("shared")
+    cache.unpin("shared")
+
+    cache.put("other", FakePhoto())
+    assert cache.get("shared") is not None
+
+    cache.unpin("shared")
+    cache.put("third", FakePhoto())
+    assert cache.get("shared") is None
+
+
+def test_unpin_all_releases_every_tile():
+    cache = TileCache(limit_bytes=400)
+    cache.put("a", FakePhoto())
+    cache.pin("a")
+    cache.pin("a")
+    cache.unpin_all()
+    cache.put("b", FakePhoto())
+    assert cache.get("a") is None and cache.get("b") is not None
+
+
+def chunk(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(str(tmp_path))
+
+
+@pytest.mark.parametrize("digest", ["/etc/hostname", "../" + "a" * 61, "A" * 64, "a" * 63, ""])
+def test_store_refuses_digests_that_are_not_sha256(store, digest):
+    with pytest.raises(ValueError):
+        store.path(digest)
+    with pytest.raises(ValueError):
+        store.has(digest)
+
+
+@pytest.mark.parametrize("index, total", [(-1, 1), (1, 1), (0, 0), (0, MAX_CHUNKS + 1)])
+def test_chunk_out_of_bounds_is_rejected(store, index, total):
+    with pytest.raises(ValueError):
+        store.add_chunk("a" * 64, index, total, chunk(b"x"))
+    assert not store._partial
+
+
+def test_chunks_round_trip_and_hash_is_checked(store):
+    data = b"x" * (CHUNK_SIZE + 10)
+    digest = hashlib.sha256(data).hexdigest()
+    assert not store.add_chunk(digest, 1, 2, chunk(data[CHUNK_SIZE:]))
+    assert store.add_chunk(digest, 0, 2, chunk(data[:CHUNK_SIZE]))
+    assert store.has(digest)
+    assert [payload for _, _, payload in store.chunks(digest)] == [chunk(data[:CHUNK_SIZE]), chunk(data[CHUNK_SIZE:])]
+
+    with pytest.raises(ValueError):
+        store.add_chunk("b" * 64, 0, 1, chunk(b"outro conteudo"))
+
+
+def test_pending_images_are_bounded(store):
+    for n in range(MAX_PENDING_IMAGES):
+        store.add_chunk(f"{n:064x}", 0, 2, chunk(b"x"))
+    with pytest.raises(ValueError):
+        store.add_chunk("f" * 64, 0, 2, chunk(b"x"))
+    store.discard_partial(f"{0:064x}")
+    store.add_chunk("f" * 64, 0, 2, chunk(b"x"))
+
+
+def test_manager_ignores_invalid_and_unrequested_messages(store):
+    sent = []
+
+    class FakePeer:
+        def envia_mensagem(self, msg):
+            sent.append(msg)
+
+    manager = ImageManager(FakePeer(), lambda *args: 0, store)
+    open(os.path.join(store.directory, "segredo"), "w").close()
+    manager.handle_message("bob", "imgwant", ["../segredo"])
+    manager.handle_message("bob", "imgwant", ["/etc/hostname"])
+    assert sent == []
+
+    # pedaço de uma imagem que não foi pedida
+    manager.handle_message("bob", "imgchunk", ["c" * 64, "0", "2", chunk(b"x")])
+    assert not store._partial
+
+    # imagem pedida com um pedaço inválido: o pedido é descartado e pode ser refeito
+    manager.handle_message("bob", "image", ["d" * 64, "0", "0", "10", "10", "0"])
+    assert sent == ["imgwant:" + "d" * 64]
+    manager.handle_message("bob", "imgchunk", ["d" * 64, "5", "2", chunk(b"x")])
+    assert "d" * 64 not in manager._requested
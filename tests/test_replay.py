@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+pytest.importorskip("PIL")
+pytest.importorskip("tkinter")
+
+from PIL import Image, ImageChops
+
+import replay
+from document import Document
+from image_tool import ImageStore
+from replay import ReplayEngine
+from selection_tool import encode_ranges
+
+SIZE = (200, 150)
+
+
+def random_session(rows, seed=0):
+    """
+    sessão com traços, formas, textos, limpezas e seleções movidas/escaladas.
+    """
+    rng = random.Random(seed)
+    document = Document()
+    seqs = {"alice": 0, "bob": 0}
+    t = 0.0
+    for _ in range(rows):
+        t += 0.01
+        user = rng.choice(("alice", "bob"))
+        roll = rng.random()
+        if roll < 0.01:
+            document.append(user, "clear", t=t)
+        elif roll < 0.04 and seqs[user]:
+            ops = [(user, n) for n in range(max(0, seqs[user] - 30), seqs[user])]
+            document.append(user, "select", extra=encode_ranges(ops), t=t)
+        elif roll < 0.08:
+            document.append(user, "move", "", 0, rng.randint(-5, 5), rng.randint(-5, 5), t=t)
+        elif roll < 0.10:
+            document.append(user, "scale", "", 0, rng.randint(0, 200), rng.randint(0, 150),
+                            rng.choice((0.9, 1.1)), t=t)
+        else:
+            tool = rng.choice(("pen", "pen", "eraser", "line", "rectangle", "circle", "text"))
+            x1, y1 = rng.randint(0, 200), rng.randint(0, 150)
+            x2, y2 = x1 + rng.randint(0, 40), y1 + rng.randint(0, 40)
+            extra = "oi" if tool == "text" else None
+            document.append(user, tool, rng.choice(("#000000", "#FF0000")), rng.randint(1, 4),
+                            x1, y1, x2, y2, extra=extra, seq=seqs[user], t=t)
+            seqs[user] += 1
+    return document
+
+
+def same(a, b):
+    return ImageChops.difference(a.convert("RGB"), b.convert("RGB")).getbbox() is None
+
+
+@pytest.fixture
+def engine(monkeypatch, tmp_path):
+    # keyframes pequenos para a sessão de teste ter vários
+    monkeypatch.setattr(replay, "KEYFRAME_EVERY", 50)
+    return ReplayEngine(random_session(1200), SIZE, ImageStore(str(tmp_path)))
+
+
+def test_seek_matches_full_render(engine):
+    rng = random.Random(1)
+    for t in [rng.uniform(0, engine.duration) for _ in range(25)] + [0, engine.duration]:
+        image = engine.seek(t)
+        assert engine.scene.stop == engine.row_at(t)
+        assert same(image, engine.rasterizer.render(engine.scene)), t
+
+
+def test_playback_matches_seek(engine, tmp_path):
+    other = ReplayEngine(engine.document, SIZE, ImageStore(str(tmp_path)))
+    engine.seek(0)
+    t = 0.0
+    while t < engine.duration:
+        t += 0.37
+        assert same(engine.advance_to(t), other.seek(t)), t
+
+
+def test_keyframes_are_spaced_and_compressed(engine):
+    assert len(engine.keyframes) == -(-engine.length // replay.KEYFRAME_EVERY)
+    assert [keyframe.stop for keyframe in engine.keyframes] == [
+        index * replay.KEYFRAME_EVERY for index in range(len(engine.keyframes))]
+    assert all(len(data) < SIZE[0] * SIZE[1] * 3 for data in engine._compressed)
+
+
+def test_timelapse_writes_frames(engine, tmp_path):
+    frames = engine.timelapse(str(tmp_path / "quadros"), fps=10, speed=5)
+    assert frames == len(list((tmp_path / "quadros").iterdir()))
+    last = Image.open(tmp_path / "quadros" / f"frame_{frames - 1:06d}.png")
+    assert same(last, engine.rasterizer.render(engine.scene))
+
+
+def test_scaled_image_is_rendered_from_the_pyramid(tmp_path):
+    store = ImageStore(str(tmp_path))
+    source = Image.new("RGB", (1000, 800), "red")
+    path = tmp_path / "fonte.png"
+    source.save(path)
+    digest = store.put(path.read_bytes())
+
+    document = Document()
+    document.append("alice", "image", "", 0, 10, 10, 60, 50, extra=digest, seq=0, t=0)
+    document.append("alice", "select", extra="alice.0", t=1)
+    document.append("alice", "scale", "", 0, 10, 10, 2, t=2)
+    engine = ReplayEngine(document, SIZE, store)
+
+    image = engine.seek(engine.duration)
+    assert image.getpixel((100, 80)) == (255, 0, 0)
+    assert image.getpixel((150, 120)) == (255, 255, 255)
+    assert len(engine.rasterizer._pyramids) == 1
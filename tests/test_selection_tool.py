@@ -0,0 +1,19 @@
+from selection_tool import decode_ranges, encode_ranges
+
+
+def test_consecutive_ops_become_one_range():
+    assert encode_ranges([("alice", n) for n in (3, 1, 2, 4)]) == "alice.1-4"
+
+
+def test_gaps_and_single_ops():
+    assert encode_ranges([("bob", 1), ("bob", 2), ("bob", 5), ("bob", 7), ("bob", 8)]) == "bob.1-2,bob.5,bob.7-8"
+
+
+def test_round_trip_with_several_users():
+    ops = {("alice", n) for n in range(10)} | {("bob", 4), ("bob", 9)} | {("a.b", 0), ("a.b", 1)}
+    assert set(decode_ranges(encode_ranges(ops))) == ops
+
+
+def test_decode_ignores_empty_items():
+    assert list(decode_ranges("")) == []
+    assert list(decode_ranges("alice.2,,bob.0-1")) == [("alice", 2), ("bob", 0), ("bob", 1)]
@@ -0,0 +1,157 @@
+import glob
+import itertools
+import os
+import threading
+import time
+
+import pytest
+
+import shm_transport
+from shm_transport import ShmRing
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def ring():
+    rings = []
+
+    def create(capacity=shm_transport.RING_CAPACITY):
+        created = ShmRing.create(f"paintpy_test_{os.getpid()}_{next(_names)}", capacity)
+        rings.append(created)
+        return created
+
+    yield create
+    for created in rings:
+        name = created.shm.name
+        if created.buf is not None:
+            created.close()
+        for bell in glob.glob(shm_transport._bell_path(name, "*")):
+            os.unlink(bell)
+
+
+def test_messages_arrive_in_order(ring):
+    producer = ring()
+    consumer = producer.register()
+    assert consumer.read_nowait() == []
+
+    messages = [f"alice:pen:{n}:#000000:2:0:0:1:1".encode() for n in range(100)]
+    for message in messages:
+        producer.write(message)
+    assert consumer.read_nowait() == messages
+    assert consumer.read(timeout=0) == []
+
+
+def test_wraparound(ring):
+    # capacidade pequena e tamanhos variados: registros e prefixos de tamanho dão a volta no anel
+    producer = ring(capacity=64)
+    consumer = producer.register()
+    received = []
+    sent = []
+    for n in range(500):
+        message = bytes([n % 256]) * (n % 23 + 1)
+        producer.write(message)
+        sent.append(message)
+        # no máximo dois registros pendentes (2 * (4 + 23) bytes) cabem no anel
+        if n % 2:
+            received += consumer.read_nowait()
+    received += consumer.read_nowait()
+    assert received == sent
+
+
+def test_each_consumer_reads_everything_from_registration(ring):
+    producer = ring()
+    first = producer.register()
+    producer.write(b"antes")
+    second = producer.register()
+    producer.write(b"depois")
+
+    assert first.read_nowait() == [b"antes", b"depois"]
+    assert second.read_nowait() == [b"depois"]
+
+
+def test_message_larger_than_ring(ring):
+    producer = ring(capacity=64)
+    with pytest.raises(ValueError):
+        producer.write(b"x" * 64)
+
+
+def test_stalled_consumer_is_dropped(ring, monkeypatch):
+    monkeypatch.setattr(shm_transport, "WRITE_TIMEOUT", 0.01)
+    producer = ring(capacity=64)
+    stalled = producer.register()
+    reader = producer.register()
+
+    for n in range(20):
+        producer.write(bytes([n]) * 10)
+        reader.read_nowait()
+
+    with pytest.raises(ConnectionError):
+        stalled.read_nowait()
+    # a vaga liberada volta a ser usada
+    assert producer.register().index == stalled.index
+
+
+def test_consumer_slots_are_limited(ring):
+    producer = ring()
+    for _ in range(shm_transport.MAX_CONSUMERS):
+        producer.register()
+    with pytest.raises(RuntimeError):
+        producer.register()
+
+
+def test_available_by_default(monkeypatch):
+    monkeypatch.delenv(shm_transport.ENV_VAR, raising=False)
+    assert shm_transport.available()
+    monkeypatch.setenv(shm_transport.ENV_VAR, "0")
+    assert not shm_transport.available()
+
+
+def _read_in_thread(consumer, **kwargs):
+    result = {}
+
+    def run():
+        start = time.monotonic()
+        result["messages"] = consumer.read(**kwargs)
+        result["elapsed"] = time.monotonic() - start
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def test_blocked_read_wakes_on_write(ring, monkeypatch):
+    # sem a campainha, o consumidor só veria a mensagem depois de WAKE_CHECK
+    monkeypatch.setattr(shm_transport, "WAKE_CHECK", 30.0)
+    producer = ring()
+    consumer = producer.register()
+    thread, result = _read_in_thread(consumer)
+    time.sleep(0.1)
+    producer.write(b"acorda")
+    thread.join(5)
+    assert result["messages"] == [b"acorda"]
+    assert result["elapsed"] < 5
+
+
+def test_interrupt_wakes_blocked_read(ring, monkeypatch):
+    monkeypatch.setattr(shm_transport, "WAKE_CHECK", 30.0)
+    producer = ring()
+    consumer = producer.register()
+    thread, result = _read_in_thread(consumer)
+    time.sleep(0.1)
+    consumer.interrupt()
+    thread.join(5)
+    assert result["messages"] == []
+    assert result["elapsed"] < 5
+
+
+def test_read_timeout(ring):
+    producer = ring()
+    consumer = producer.register()
+    start = time.monotonic()
+    assert consumer.read(timeout=0.05) == []
+    assert time.monotonic() - start >= 0.05
+    # a vaga não fica marcada como bloqueada depois do timeout
+    assert producer.buf[shm_transport._PARKED * 8 + consumer.slot] == 0
+    producer.write(b"depois")
+    assert consumer.read(timeout=0) == [b"depois"]
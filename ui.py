@@ -1,5 +1,12 @@
+import queue
+import threading
 import tkinter as tk
-from tkinter import colorchooser,  messagebox
+from tkinter import colorchooser,  messagebox, filedialog
+
+from replay import ReplayEngine, ReplayWindow
+
+# intervalo em ms com que a thread do Tk verifica se o replay ficou pronto
+REPLAY_POLL_MS = 50
 
 """
 Essa classe foi criada com auxílio de IA 
@@ -61,11 +68,24 @@ class PaintUI:
         self.text_button = tk.Button(self.toolbar, text="Text", command=lambda: self.drawing_tools.set_tool("text"))
         self.text_button.pack(side=tk.LEFT, padx=2, pady=5)
 
+        self.image_button = tk.Button(self.toolbar, text="Image", command=lambda: self.drawing_tools.set_tool("image"))
+        self.image_button.pack(side=tk.LEFT, padx=2, pady=5)
+
+        self.select_button = tk.Button(self.toolbar, text="Select", command=lambda: self.drawing_tools.set_tool("select"))
+        self.select_button.pack(side=tk.LEFT, padx=2, pady=5)
+
         tk.Frame(self.toolbar, width=1, bg="grey", height=30).pack(side=tk.LEFT, padx=10)
 
         self.clear_button = tk.Button(self.toolbar, text="Clear", command=self._clear_canvas)
         self.clear_button.pack(side=tk.LEFT, padx=5, pady=5)
 
+        # gravação e reprodução da sessão
+        self.save_button = tk.Button(self.toolbar, text="Save", command=self._save_session)
+        self.save_button.pack(side=tk.LEFT, padx=5, pady=5)
+
+        self.replay_button = tk.Button(self.toolbar, text="Replay", command=self._open_replay)
+        self.replay_button.pack(side=tk.LEFT, padx=5, pady=5)
+
     def _setup_canvas(self):
         """
         cria e configura a área de desenho (canvas).
@@ -103,4 +123,51 @@ class PaintUI:
         if resposta:
             self.drawing_tools.clear_canvas()
             if self.peer:
-                self.drawing_tools.send_clear()
\ No newline at end of file
+                self.drawing_tools.send_clear()
+
+    def _save_session(self):
+        """
+        grava todas as operações da sessão em arquivo (pode ser usado pelo replay.py).
+        """
+        path = filedialog.asksaveasfilename(title="Salvar sessão", defaultextension=".paintpy",
+                                            filetypes=[("Sessão PaintPy", "*.paintpy")])
+        if path:
+            self.drawing_tools.document.save(path)
+
+    def _open_replay(self):
+        """
+        abre a janela de reprodução da sessão até o momento.
+
+        os keyframes são rasterizados em uma thread de trabalho (o tempo cresce com
+        a sessão); a janela é aberta na thread do Tk quando o engine fica pronto.
+        """
+        size = (max(1, self.canvas.winfo_width()), max(1, self.canvas.winfo_height()))
+        results = queue.Queue()
+
+        def build():
+            try:
+                results.put(ReplayEngine(self.drawing_tools.document, size, self.drawing_tools.images.store))
+            except Exception as e:
+                results.put(e)
+
+        self.replay_button.config(state=tk.DISABLED, text="Replay...")
+        worker = threading.Thread(target=build)
+        worker.daemon = True
+        worker.start()
+        self.root.after(REPLAY_POLL_MS, self._poll_replay, results)
+
+    def _poll_replay(self, results):
+        """
+        abre a janela de reprodução quando a thread de trabalho terminar.
+        """
+        try:
+            engine = results.get_nowait()
+        except queue.Empty:
+            self.root.after(REPLAY_POLL_MS, self._poll_replay, results)
+            return
+
+        self.replay_button.config(state=tk.NORMAL, text="Replay")
+        if isinstance(engine, Exception):
+            messagebox.showerror(title="Replay", message=f"Não foi possível abrir o replay: {engine}")
+            return
+        ReplayWindow(self.root, engine)